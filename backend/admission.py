@@ -0,0 +1,225 @@
+"""
+Upload Admission Control
+Bounds concurrent uploads and bytes in flight per worker and rate limits uploads per user and per event
+"""
+
+from collections import OrderedDict
+from typing import Optional, Tuple
+import math
+import os
+import re
+import time
+
+from fastapi import HTTPException, status
+from jose import JWTError, jwt
+from starlette.responses import JSONResponse
+
+from auth import SECRET_KEY, ALGORITHM
+from storage import UPLOAD_BATCH_MAX_FILES
+
+# Configuration
+UPLOAD_MAX_CONCURRENT = int(os.getenv("UPLOAD_MAX_CONCURRENT", "64"))
+UPLOAD_MAX_INFLIGHT_BYTES = int(os.getenv("UPLOAD_MAX_INFLIGHT_MB", "256")) * 1024 * 1024
+UPLOAD_RETRY_AFTER = int(os.getenv("UPLOAD_RETRY_AFTER", "1"))
+UPLOAD_USER_RATE = float(os.getenv("UPLOAD_USER_RATE", "2"))
+UPLOAD_USER_BURST = float(os.getenv("UPLOAD_USER_BURST", "50"))
+UPLOAD_EVENT_RATE = float(os.getenv("UPLOAD_EVENT_RATE", "200"))
+UPLOAD_EVENT_BURST = float(os.getenv("UPLOAD_EVENT_BURST", "1000"))
+RATE_LIMIT_MAX_KEYS = 100_000
+RATE_LIMIT_IDLE_SECONDS = 600
+
+# POST routes that carry upload bodies; the first group is the event id
+UPLOAD_PATHS = [re.compile(r"^/events/([^/]+)/upload$"), re.compile(r"^/events/([^/]+)/upload/batch$")]
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by an arbitrary string, evicting keys that have gone idle"""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = RATE_LIMIT_MAX_KEYS,
+                 idle_seconds: float = RATE_LIMIT_IDLE_SECONDS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.idle_seconds = idle_seconds
+        # key -> [tokens, last refill time], least recently used first
+        self.buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def acquire(self, key: str, cost: float = 1.0, now: Optional[float] = None) -> float:
+        """Take `cost` tokens; return 0 on success or the seconds until enough tokens accrue
+
+        A cost above the burst can never be met, so its wait is infinite.
+        """
+        bucket = self._refill(key, time.monotonic() if now is None else now)
+        wait = self._wait(bucket, cost)
+        if not wait:
+            bucket[0] -= cost
+        return wait
+
+    def wait(self, key: str, cost: float = 1.0, now: Optional[float] = None) -> float:
+        """Seconds until `cost` tokens are available, without taking them"""
+        return self._wait(self._refill(key, time.monotonic() if now is None else now), cost)
+
+    def _refill(self, key: str, now: float) -> list:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = [self.burst, now]
+            self.buckets[key] = bucket
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self.buckets.move_to_end(key)
+        self._evict(now)
+        return bucket
+
+    def _wait(self, bucket: list, cost: float) -> float:
+        if bucket[0] >= cost:
+            return 0.0
+        if cost > self.burst or not self.rate:
+            return float("inf")
+        return (cost - bucket[0]) / self.rate
+
+    def _evict(self, now: float):
+        # Oldest entries sit at the front, so this stops at the first live key
+        while self.buckets:
+            key, (tokens, last) = next(iter(self.buckets.items()))
+            if len(self.buckets) <= self.max_keys and now - last < self.idle_seconds:
+                break
+            del self.buckets[key]
+
+
+class UploadGate:
+    """Per-worker cap on concurrent uploads and bytes in flight"""
+
+    def __init__(self, max_concurrent: int = UPLOAD_MAX_CONCURRENT,
+                 max_bytes: int = UPLOAD_MAX_INFLIGHT_BYTES):
+        self.max_concurrent = max_concurrent
+        self.max_bytes = max_bytes
+        self.active = 0
+        self.inflight_bytes = 0
+        self.rejected = 0
+
+    def try_acquire(self, size: int) -> bool:
+        # A single oversized upload is still admitted when nothing else is in flight
+        if self.active >= self.max_concurrent or (
+            self.active and self.inflight_bytes + size > self.max_bytes
+        ):
+            self.rejected += 1
+            return False
+        self.active += 1
+        self.inflight_bytes += size
+        return True
+
+    def release(self, size: int):
+        self.active -= 1
+        self.inflight_bytes -= size
+
+    def stats(self) -> dict:
+        return {
+            "active_uploads": self.active,
+            "inflight_bytes": self.inflight_bytes,
+            "rejected": self.rejected,
+            "max_concurrent": self.max_concurrent,
+            "max_inflight_bytes": self.max_bytes
+        }
+
+
+upload_gate = UploadGate()
+user_limiter = TokenBucketLimiter(UPLOAD_USER_RATE, UPLOAD_USER_BURST)
+event_limiter = TokenBucketLimiter(UPLOAD_EVENT_RATE, UPLOAD_EVENT_BURST)
+
+
+def batch_max_files() -> int:
+    """Largest batch accepted; every file costs a token, so no batch may exceed either burst"""
+    return int(min(UPLOAD_BATCH_MAX_FILES, user_limiter.burst, event_limiter.burst))
+
+
+def charge_batch_files(user_email: str, event_id: str, files: int):
+    """Charge the rest of a parsed batch's files; the middleware took one token for the request itself
+
+    Both buckets are checked before either is charged, so a rejected batch costs nothing.
+    """
+    if files <= 1:
+        return
+    charges = ((user_limiter, user_email, "Upload rate limit exceeded"),
+               (event_limiter, event_id, "Event upload rate limit exceeded"))
+    for limiter, key, detail in charges:
+        wait = limiter.wait(key, files - 1)
+        if wait:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=detail,
+                headers={"Retry-After": str(max(1, math.ceil(wait)))}
+            )
+    for limiter, key, _ in charges:
+        limiter.acquire(key, files - 1)
+
+
+def _match_upload(scope) -> Optional[str]:
+    if scope["method"] != "POST":
+        return None
+    for pattern in UPLOAD_PATHS:
+        match = pattern.match(scope["path"])
+        if match:
+            return match.group(1)
+    return None
+
+
+def _request_identity(scope) -> Tuple[Optional[str], int]:
+    """Extract the authenticated user and declared body size from the headers"""
+    user_email, size = None, 0
+    for name, value in scope["headers"]:
+        if name == b"content-length" and value.isdigit():
+            size = int(value)
+        elif name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                try:
+                    user_email = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+                except JWTError:
+                    user_email = None
+    return user_email, size
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that sheds upload load before the request body is read"""
+
+    def __init__(self, app, gate: UploadGate = upload_gate):
+        self.app = app
+        self.gate = gate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        event_id = _match_upload(scope)
+        if event_id is None:
+            return await self.app(scope, receive, send)
+
+        user_email, size = _request_identity(scope)
+        # Anonymous requests must not drain the buckets of real guests
+        if user_email is None:
+            return await JSONResponse(
+                {"detail": "Could not validate credentials"},
+                status_code=401,
+                headers={"WWW-Authenticate": "Bearer"}
+            )(scope, receive, send)
+        wait = user_limiter.acquire(user_email)
+        if wait:
+            return await _reject(429, "Upload rate limit exceeded", wait)(scope, receive, send)
+        wait = event_limiter.acquire(event_id)
+        if wait:
+            return await _reject(429, "Event upload rate limit exceeded", wait)(scope, receive, send)
+
+        if not self.gate.try_acquire(size):
+            return await _reject(503, "Server is busy, retry later", UPLOAD_RETRY_AFTER)(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.gate.release(size)
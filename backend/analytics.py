@@ -0,0 +1,148 @@
+"""
+Event Analytics
+Running per-event and per-voucher aggregates, updated as uploads and redemptions happen
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+import os
+import time
+
+# Configuration
+ANALYTICS_WINDOW_MINUTES = int(os.getenv("ANALYTICS_WINDOW_MINUTES", "60"))
+
+
+class MinuteCounter:
+    """Ring buffer of per-minute counts over the last `size` minutes"""
+
+    def __init__(self, size: int = ANALYTICS_WINDOW_MINUTES):
+        self.counts = [0] * size
+        self.minutes = [-1] * size  # the minute each slot currently counts
+
+    def add(self, at: float, amount: int = 1):
+        minute = int(at // 60)
+        slot = minute % len(self.counts)
+        if self.minutes[slot] != minute:
+            if self.minutes[slot] > minute:
+                return  # older than the window
+            self.minutes[slot] = minute
+            self.counts[slot] = 0
+        self.counts[slot] += amount
+
+    def series(self, now: float) -> List[int]:
+        """Counts for each minute of the window, oldest first, ending with the current minute"""
+        current = int(now // 60)
+        size = len(self.counts)
+        return [
+            self.counts[minute % size] if self.minutes[minute % size] == minute else 0
+            for minute in range(current - size + 1, current + 1)
+        ]
+
+
+class VoucherStats:
+    def __init__(self, voucher_id: str, code: str, max_uses: int, used_count: int = 0):
+        self.voucher_id = voucher_id
+        self.code = code
+        self.max_uses = max_uses
+        self.redeemed = used_count
+        self.attempts = used_count
+
+    def to_dict(self) -> dict:
+        return {
+            "voucher_id": self.voucher_id,
+            "code": self.code,
+            "max_uses": self.max_uses,
+            "redeemed": self.redeemed,
+            "attempts": self.attempts,
+            "failed": self.attempts - self.redeemed,
+            "redemption_rate": round(self.redeemed / self.max_uses, 4) if self.max_uses else 0.0,
+            "success_rate": round(self.redeemed / self.attempts, 4) if self.attempts else 0.0,
+        }
+
+
+class EventStats:
+    def __init__(self):
+        self.uploads = 0
+        self.bytes = 0
+        self.photos = 0
+        self.videos = 0
+        self.other = 0
+        self.contributors: Set[str] = set()
+        self.last_upload_at: Optional[float] = None
+        self.per_minute = MinuteCounter()
+        self.vouchers: Dict[str, VoucherStats] = {}
+
+    def to_dict(self, now: float) -> dict:
+        series = self.per_minute.series(now)
+        return {
+            "uploads": self.uploads,
+            "bytes": self.bytes,
+            "contributors": len(self.contributors),
+            "photos": self.photos,
+            "videos": self.videos,
+            "other": self.other,
+            "last_upload_at": datetime.fromtimestamp(self.last_upload_at).isoformat() if self.last_upload_at else None,
+            "uploads_last_minute": series[-1],
+            "uploads_per_minute": series,
+            "window_minutes": len(series),
+            "vouchers": [stats.to_dict() for stats in self.vouchers.values()],
+        }
+
+
+class Analytics:
+    """Aggregates keyed by event id; every update touches only the event it concerns"""
+
+    def __init__(self):
+        self.events: Dict[str, EventStats] = {}
+
+    def _event(self, event_id: str) -> EventStats:
+        stats = self.events.get(event_id)
+        if stats is None:
+            stats = self.events[event_id] = EventStats()
+        return stats
+
+    def record_upload(self, event_id: str, moment: dict, at: Optional[float] = None):
+        stats = self._event(event_id)
+        at = time.time() if at is None else at
+        stats.uploads += 1
+        stats.bytes += moment.get("file_size") or 0
+        file_type = moment.get("file_type") or ""
+        if file_type.startswith("image/"):
+            stats.photos += 1
+        elif file_type.startswith("video/"):
+            stats.videos += 1
+        else:
+            stats.other += 1
+        stats.contributors.add(moment["user_id"])
+        stats.last_upload_at = max(at, stats.last_upload_at or at)
+        stats.per_minute.add(at)
+
+    def track_voucher(self, event_id: str, voucher_id: str, code: str, max_uses: int, used_count: int = 0):
+        self._event(event_id).vouchers[voucher_id] = VoucherStats(voucher_id, code, max_uses, used_count)
+
+    def record_redemption(self, event_id: str, voucher_id: str, success: bool):
+        stats = self.events[event_id].vouchers.get(voucher_id) if event_id in self.events else None
+        if stats is None:
+            return
+        stats.attempts += 1
+        if success:
+            stats.redeemed += 1
+
+    def forget_event(self, event_id: str):
+        self.events.pop(event_id, None)
+
+    def restore_moments(self, event_id: str, moments: List[dict]):
+        """Rebuild an event's upload aggregates from its recovered moments"""
+        for moment in moments:
+            try:
+                at = datetime.fromisoformat(moment["uploaded_at"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                at = 0.0
+            self.record_upload(event_id, moment, at)
+
+    def event_stats(self, event_id: str) -> dict:
+        stats = self.events.get(event_id) or EventStats()
+        return {"event_id": event_id, **stats.to_dict(time.time())}
+
+
+analytics = Analytics()
@@ -6,6 +6,8 @@ from fastapi import HTTPException, status
 import os
 import uuid
 from dotenv import load_dotenv
+from journal import journal
+from revocation import revocations
 
 load_dotenv()
 
@@ -73,7 +75,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -88,6 +90,13 @@ def verify_token(token: str):
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        jti = payload.get("jti")
+        if jti is not None and revocations.is_revoked(jti, payload["exp"]):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
         user = get_user(email)
         if user is None:
             raise HTTPException(
@@ -103,6 +112,19 @@ def verify_token(token: str):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+async def revoke_token(token: str):
+    """Revoke a token until it expires"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if payload.get("jti") is not None:
+        await revocations.revoke(payload["jti"], payload["exp"])
+
 def create_user(email: str, password: str, full_name: str, role: str = "user"):
     """Create a new user"""
     if email in users_db:
@@ -120,6 +142,7 @@ def create_user(email: str, password: str, full_name: str, role: str = "user"):
         "is_active": True
     }
     users_db[email] = user
+    journal.append_nowait(("user", email, user))
     return user
 
 def authenticate_apple_user(identity_token: str, authorization_code: str):
@@ -137,6 +160,7 @@ def authenticate_apple_user(identity_token: str, authorization_code: str):
             "is_active": True
         }
         users_db[apple_email] = user
+        journal.append_nowait(("user", apple_email, user))
     
     return users_db[apple_email]
 
@@ -155,5 +179,6 @@ def authenticate_google_user(id_token: str, access_token: str):
             "is_active": True
         }
         users_db[google_email] = user
+        journal.append_nowait(("user", google_email, user))
     
     return users_db[google_email]
@@ -0,0 +1,4 @@
+"""
+SuperMoment benchmark suite
+Drives the FastAPI app in-process or over a local uvicorn and reports latency numbers
+"""
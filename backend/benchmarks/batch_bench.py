@@ -0,0 +1,104 @@
+"""
+Batch upload benchmark: per-photo cost of one batch request vs one request per photo
+Usage (from backend/): python -m benchmarks.batch_bench --photos 200 --size 262144
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import admission
+from benchmarks.datasets import build_dataset
+from benchmarks.run import RESULTS_DIR, TRANSPORTS
+
+BATCH_SIZES = [1, 5, 10, 20, 50, 100]
+FORM = {"latitude": "44.81", "longitude": "20.46", "timestamp": "2025-01-01T20:00:00"}
+
+
+async def _measure(client, dataset, photos: int, batch_size: int, payload: bytes, concurrency: int) -> dict:
+    """Upload `photos` files in batches of `batch_size` from different guests"""
+    batches = [min(batch_size, photos - start) for start in range(0, photos, batch_size)]
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def send(i: int, count: int):
+        nonlocal errors
+        email = dataset.user_emails[i % len(dataset.user_emails)]
+        headers = {"Authorization": f"Bearer {dataset.tokens[email]}"}
+        async with semaphore:
+            if batch_size == 1:
+                response = await client.post(
+                    f"/events/{dataset.hot_event_id}/upload",
+                    files={"file": ("photo.jpg", payload, "image/jpeg")}, data=FORM, headers=headers
+                )
+            else:
+                response = await client.post(
+                    f"/events/{dataset.hot_event_id}/upload/batch",
+                    files=[("files", (f"photo-{n}.jpg", payload, "image/jpeg")) for n in range(count)],
+                    data={key: [value] * count for key, value in FORM.items()},
+                    headers=headers
+                )
+        if response.status_code >= 400:
+            errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(i, count) for i, count in enumerate(batches)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(batches),
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "ms_per_photo": round(elapsed / photos * 1000, 3),
+        "photos_per_s": round(photos / elapsed, 1),
+    }
+
+
+async def _run(args) -> dict:
+    dataset = build_dataset("tiny")
+    # Measure request overhead, not the per-file rate limits
+    for limiter in (admission.user_limiter, admission.event_limiter):
+        limiter.burst = float("inf")
+    admission.UPLOAD_BATCH_MAX_FILES = max(BATCH_SIZES)
+    payload = os.urandom(args.size)
+    results = {}
+    async with TRANSPORTS[args.transport]() as client:
+        for batch_size in BATCH_SIZES:
+            results[batch_size] = await _measure(client, dataset, args.photos, batch_size, payload, args.concurrency)
+            print(f"batch {batch_size:>3}  {results[batch_size]}", flush=True)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="SuperMoment batch upload benchmark")
+    parser.add_argument("--photos", type=int, default=200, help="Photos uploaded per batch size")
+    parser.add_argument("--size", type=int, default=256 * 1024, help="Bytes per photo")
+    parser.add_argument("--transport", choices=sorted(TRANSPORTS), default="asgi")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight")
+    parser.add_argument("--output", help="Where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="supermoment-batch-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        results = asyncio.run(_run(args))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-batch.json")
+    with open(output, "w") as f:
+        json.dump({"photos": args.photos, "size": args.size, "transport": args.transport, "batches": results}, f, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
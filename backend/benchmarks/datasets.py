@@ -0,0 +1,162 @@
+"""
+Dataset generators for the benchmark suite
+Seed the in-memory stores of auth.py, events.py and main.py directly
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List
+import random
+import uuid
+
+import auth
+import events as event_store
+import main
+from models import Event, EventStatus, Voucher, VoucherStatus
+
+# Named dataset sizes; "large" is the reference size for regression tracking
+SCALES = {
+    "tiny": {"events": 100, "vouchers": 1_000, "moments": 10_000, "users": 200},
+    "small": {"events": 1_000, "vouchers": 10_000, "moments": 100_000, "users": 1_000},
+    "large": {"events": 10_000, "vouchers": 100_000, "moments": 1_000_000, "users": 10_000},
+}
+
+BENCH_PASSWORD = "bench-password"
+ADMIN_EMAIL = "bench-admin@supermoment.com"
+
+
+@dataclass
+class Dataset:
+    """Handles to the seeded data that scenarios need"""
+    admin_email: str
+    user_emails: List[str]
+    event_ids: List[str]
+    hot_event_id: str
+    voucher_codes: List[str] = field(default_factory=list)
+    tokens: Dict[str, str] = field(default_factory=dict)
+
+
+def reset_stores():
+    """Clear every in-memory store the benchmarks touch"""
+    event_store.events_db.clear()
+    event_store.vouchers_db.clear()
+    event_store.event_participants.clear()
+    main.events.clear()
+    for email in [e for e in auth.users_db if e.startswith("bench-")]:
+        del auth.users_db[email]
+
+
+def generate_users(count: int) -> List[str]:
+    """Create benchmark users sharing one precomputed password hash"""
+    hashed_password = auth.get_password_hash(BENCH_PASSWORD)
+    emails = [ADMIN_EMAIL] + [f"bench-user-{i}@example.com" for i in range(count)]
+    for i, email in enumerate(emails):
+        auth.users_db[email] = {
+            "email": email,
+            "hashed_password": hashed_password,
+            "full_name": f"Bench User {i}",
+            "role": "admin" if email == ADMIN_EMAIL else "user",
+            "is_active": True
+        }
+    return emails[1:]
+
+
+def generate_events(count: int, admin_email: str, user_emails: List[str], rng: random.Random) -> List[str]:
+    """Create events spread around the globe with a handful of participants each"""
+    now = datetime.utcnow()
+    event_ids = []
+    for i in range(count):
+        event_id = str(uuid.uuid4())
+        event_store.events_db[event_id] = Event.model_construct(
+            id=event_id,
+            admin_email=admin_email,
+            created_at=now,
+            updated_at=now,
+            title=f"Bench event {i}",
+            description=f"Generated event number {i} for load testing",
+            location=f"Venue {i % 500}",
+            latitude=rng.uniform(-60.0, 70.0),
+            longitude=rng.uniform(-180.0, 180.0),
+            event_date=now + timedelta(hours=rng.randint(-720, 720)),
+            max_participants=None,
+            status=EventStatus.ACTIVE,
+            participant_count=0
+        )
+        participants = [admin_email] + rng.sample(user_emails, min(5, len(user_emails)))
+        event_store.event_participants[event_id] = participants
+        event_store.events_db[event_id].participant_count = len(participants)
+        main.events[event_id] = {"id": event_id, "moments": []}
+        event_ids.append(event_id)
+    return event_ids
+
+
+def generate_vouchers(count: int, event_ids: List[str], admin_email: str, rng: random.Random) -> List[str]:
+    """Create single-use vouchers round-robin across events"""
+    now = datetime.utcnow()
+    codes = []
+    for i in range(count):
+        voucher_id = str(uuid.uuid4())
+        code = f"B{i:07d}"
+        event_store.vouchers_db[voucher_id] = Voucher.model_construct(
+            id=voucher_id,
+            code=code,
+            admin_email=admin_email,
+            created_at=now,
+            event_id=event_ids[i % len(event_ids)],
+            max_uses=1,
+            expires_at=now + timedelta(days=rng.randint(1, 30)),
+            description=None,
+            used_count=0,
+            status=VoucherStatus.ACTIVE
+        )
+        codes.append(code)
+    rng.shuffle(codes)
+    return codes
+
+
+def generate_moments(count: int, event_id: str, user_emails: List[str], rng: random.Random):
+    """Append moments to a single hot event, as a busy event would accumulate them"""
+    start = datetime.utcnow() - timedelta(hours=6)
+    moments = main.events[event_id]["moments"]
+    for i in range(count):
+        file_id = str(uuid.uuid4())
+        taken_at = start + timedelta(milliseconds=i * 20)
+        moments.append({
+            "id": str(uuid.uuid4()),
+            "file_id": file_id,
+            "filename": f"{file_id}.jpg",
+            "user_id": user_emails[i % len(user_emails)],
+            "latitude": 44.8 + rng.random() / 100,
+            "longitude": 20.4 + rng.random() / 100,
+            "timestamp": taken_at.isoformat(),
+            "uploaded_at": taken_at.isoformat(),
+            "file_size": rng.randint(200_000, 4_000_000),
+            "file_type": "image/jpeg"
+        })
+
+
+def build_dataset(scale: str = "small", seed: int = 1234) -> Dataset:
+    """Reset the stores and seed them with a dataset of the given scale"""
+    sizes = SCALES[scale]
+    rng = random.Random(seed)
+    reset_stores()
+
+    user_emails = generate_users(sizes["users"])
+    event_ids = generate_events(sizes["events"], ADMIN_EMAIL, user_emails, rng)
+    voucher_codes = generate_vouchers(sizes["vouchers"], event_ids, ADMIN_EMAIL, rng)
+    hot_event_id = event_ids[0]
+    generate_moments(sizes["moments"], hot_event_id, user_emails, rng)
+
+    tokens = {
+        email: auth.create_access_token(data={"sub": email}, expires_delta=timedelta(hours=12))
+        for email in [ADMIN_EMAIL] + user_emails
+    }
+
+    return Dataset(
+        admin_email=ADMIN_EMAIL,
+        user_emails=user_emails,
+        event_ids=event_ids,
+        hot_event_id=hot_event_id,
+        voucher_codes=voucher_codes,
+        tokens=tokens
+    )
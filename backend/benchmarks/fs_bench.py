@@ -0,0 +1,102 @@
+"""
+Upload directory benchmark: flat vs sharded layout at large file counts
+Usage (from backend/): python -m benchmarks.fs_bench --files 100000 [--root /mnt/ext4/tmp]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from benchmarks.run import RESULTS_DIR
+import storage
+
+
+def _flat_path(root: str, event_id: str, filename: str) -> str:
+    return os.path.join(root, event_id, filename)
+
+
+async def _create_files(root: str, event_id: str, names, layout: str, payload: bytes) -> float:
+    """Write every file the way upload_media does; return seconds per file"""
+    started = time.perf_counter()
+    if layout == "flat":
+        for name in names:
+            # The pre-sharding code called makedirs on the event loop for every upload
+            os.makedirs(os.path.join(root, event_id), exist_ok=True)
+            with open(_flat_path(root, event_id, name), "wb") as f:
+                f.write(payload)
+    else:
+        for name in names:
+            path = storage.media_path(event_id, name, root)
+            await storage.ensure_dir(os.path.dirname(path))
+            with open(path, "wb") as f:
+                f.write(payload)
+    return (time.perf_counter() - started) / len(names)
+
+
+def _lookups(root: str, event_id: str, names, layout: str, count: int) -> float:
+    """Random stat() of stored files; return seconds per lookup"""
+    sample = random.sample(names, min(count, len(names)))
+    resolve = _flat_path if layout == "flat" else (lambda r, e, n: storage.media_path(e, n, r))
+    started = time.perf_counter()
+    for name in sample:
+        os.stat(resolve(root, event_id, name))
+    return (time.perf_counter() - started) / len(sample)
+
+
+def _listing(root: str, event_id: str) -> float:
+    """Seconds to enumerate every file of the event"""
+    started = time.perf_counter()
+    count = sum(len(files) for _, _, files in os.walk(os.path.join(root, event_id)))
+    elapsed = time.perf_counter() - started
+    assert count > 0
+    return elapsed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="SuperMoment upload directory benchmark")
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--size", type=int, default=1024, help="Bytes per file")
+    parser.add_argument("--root", help="Directory on the filesystem to test (default: system temp)")
+    parser.add_argument("--output", help="Where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    names = [f"{uuid.uuid4()}.jpg" for _ in range(args.files)]
+    payload = os.urandom(args.size)
+    results = {"files": args.files, "file_size": args.size}
+    for layout in ("flat", "sharded"):
+        root = tempfile.mkdtemp(prefix=f"supermoment-fs-{layout}-", dir=args.root)
+        event_id = str(uuid.uuid4())
+        try:
+            create = asyncio.run(_create_files(root, event_id, names, layout, payload))
+            # Drop the dentry/inode caches' advantage as far as an unprivileged process can
+            os.sync()
+            lookup = _lookups(root, event_id, names, layout, args.lookups)
+            listing = _listing(root, event_id)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        results[layout] = {
+            "create_us_per_file": round(create * 1e6, 2),
+            "lookup_us": round(lookup * 1e6, 2),
+            "listing_s": round(listing, 4),
+        }
+        print(f"{layout:<8} {results[layout]}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-fs.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
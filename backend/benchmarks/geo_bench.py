@@ -0,0 +1,99 @@
+"""
+Geo index benchmark: nearby-events queries through the grid index vs brute-force haversine
+Usage (from backend/): python -m benchmarks.geo_bench --events 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.run import RESULTS_DIR
+from geo import GeoIndex, haversine_km
+
+RADII_KM = [1, 10, 50, 200]
+
+# Events cluster around cities the way real ones do, with a uniform sprinkle elsewhere
+CITIES = [
+    (44.81, 20.46), (45.25, 19.84), (43.32, 21.90), (48.85, 2.35), (51.51, -0.13),
+    (52.52, 13.40), (40.71, -74.01), (35.68, 139.69), (-33.87, 151.21), (-23.55, -46.63),
+]
+
+
+def _positions(count: int, rng: random.Random) -> list:
+    positions = []
+    for _ in range(count):
+        if rng.random() < 0.9:
+            lat, lon = rng.choice(CITIES)
+            positions.append((lat + rng.gauss(0, 0.3), lon + rng.gauss(0, 0.3)))
+        else:
+            positions.append((rng.uniform(-60, 70), rng.uniform(-180, 180)))
+    return positions
+
+
+def brute_force(positions: list, latitude: float, longitude: float, radius_km: float) -> list:
+    found = []
+    for key, (lat, lon) in enumerate(positions):
+        distance = haversine_km(latitude, longitude, lat, lon)
+        if distance <= radius_km:
+            found.append((distance, str(key)))
+    found.sort()
+    return found
+
+
+def _timed_ms(func, queries: list, radius_km: float) -> tuple:
+    started = time.perf_counter()
+    found = [func(lat, lon, radius_km) for lat, lon in queries]
+    return (time.perf_counter() - started) / len(queries) * 1000, found
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="SuperMoment geo index benchmark")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200, help="Index queries per radius")
+    parser.add_argument("--brute-queries", type=int, default=5, help="Brute-force queries per radius")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    positions = _positions(args.events, rng)
+
+    started = time.perf_counter()
+    index = GeoIndex()
+    for key, (lat, lon) in enumerate(positions):
+        index.add(str(key), lat, lon)
+    results = {"events": args.events, "cells": len(index.cells), "build_s": round(time.perf_counter() - started, 3)}
+    print(f"built index over {args.events} events in {results['build_s']}s ({len(index.cells)} cells)", flush=True)
+
+    queries = [(lat + rng.gauss(0, 0.1), lon + rng.gauss(0, 0.1)) for lat, lon in
+               (rng.choice(CITIES) for _ in range(args.queries))]
+    results["radii"] = {}
+    for radius_km in RADII_KM:
+        index_ms, index_found = _timed_ms(index.nearby, queries, radius_km)
+        brute_ms, brute_found = _timed_ms(lambda lat, lon, r: brute_force(positions, lat, lon, r),
+                                          queries[:args.brute_queries], radius_km)
+        if any(found != expected for found, expected in zip(index_found, brute_found)):
+            print(f"radius {radius_km} km: index results differ from brute force", file=sys.stderr)
+            return 1
+        results["radii"][radius_km] = row = {
+            "avg_matches": round(sum(map(len, index_found)) / len(index_found), 1),
+            "index_ms": round(index_ms, 3),
+            "brute_force_ms": round(brute_ms, 3),
+            "speedup": round(brute_ms / index_ms, 1),
+        }
+        print(f"radius {radius_km:>4} km  {row}", flush=True)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-geo.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
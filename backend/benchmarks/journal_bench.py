@@ -0,0 +1,198 @@
+"""
+Journal benchmarks: write amplification, recovery time and request latency impact
+Usage (from backend/): python -m benchmarks.journal_bench --records 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+import main as api
+from benchmarks.run import RESULTS_DIR, run_suite
+from journal import Journal, journal
+from models import Event, EventStatus, Voucher
+
+
+def _sample_event() -> Event:
+    now = datetime.utcnow()
+    return Event(id=str(uuid.uuid4()), admin_email="bench-admin@supermoment.com", created_at=now,
+                 updated_at=now, title="Bench event", description="Generated event", location="Venue",
+                 latitude=44.8, longitude=20.4, event_date=now, status=EventStatus.ACTIVE)
+
+
+def _sample_moment() -> dict:
+    file_id = str(uuid.uuid4())
+    return {"id": str(uuid.uuid4()), "file_id": file_id, "filename": f"{file_id}.jpg",
+            "user_id": "bench-user-1@example.com", "latitude": 44.8, "longitude": 20.4,
+            "timestamp": "2025-01-01T20:00:00", "uploaded_at": datetime.now().isoformat(),
+            "file_size": 1_500_000, "file_type": "image/jpeg"}
+
+
+async def _write_amplification(directory: str, operations: int) -> dict:
+    """Journal bytes and fsyncs per logical mutation, relative to the entity's JSON size"""
+    results = {}
+    event = _sample_event()
+    voucher = Voucher(id=str(uuid.uuid4()), code="B0000001", admin_email=event.admin_email,
+                      created_at=event.created_at, event_id=event.id, max_uses=100)
+    operations_by_kind = {
+        "create_event": lambda: [("event", event.id, event.model_dump()), ("participants", event.id, [event.admin_email])],
+        "redeem_voucher": lambda: [("participant", event.id, "bench-user-1@example.com"),
+                                   ("event", event.id, event.model_dump()),
+                                   ("voucher", voucher.id, voucher.model_dump())],
+        "upload_moment": lambda: [("moment", event.id, _sample_moment())],
+    }
+    logical_sizes = {
+        "create_event": len(event.model_dump_json()),
+        "redeem_voucher": len(event.model_dump_json()) + len(voucher.model_dump_json()),
+        "upload_moment": len(json.dumps(_sample_moment())),
+    }
+    for kind, make_records in operations_by_kind.items():
+        target = Journal(os.path.join(directory, kind), snapshot_interval=3600)
+        target.recover()
+        target.open()
+        await asyncio.gather(*(target.append(*make_records()) for _ in range(operations)))
+        target.close()
+        results[kind] = {
+            "journal_bytes_per_op": round(target.stats["bytes"] / operations, 1),
+            "logical_bytes_per_op": logical_sizes[kind],
+            "amplification": round(target.stats["bytes"] / operations / logical_sizes[kind], 2),
+            "fsyncs_per_op": round(target.stats["fsyncs"] / operations, 4),
+        }
+    return results
+
+
+async def _loop_stall(blocking) -> tuple:
+    """Run `blocking` on a worker thread; return its duration and the event loop's worst tick delay"""
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    done = False
+
+    async def tick():
+        nonlocal worst
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            worst = max(worst, time.perf_counter() - started - 0.005)
+
+    ticker = loop.create_task(tick())
+    started = time.perf_counter()
+    await loop.run_in_executor(None, blocking)
+    elapsed = time.perf_counter() - started
+    done = True
+    await ticker
+    return elapsed, worst
+
+
+def _recovery(directory: str, records: int, tail: int) -> dict:
+    """Time recovery of `records` moments from a bare journal and from a snapshot plus tail"""
+    target = Journal(directory, fsync=False, snapshot_interval=3600)
+    target.recover()
+    target.open()
+    event_id = str(uuid.uuid4())
+    moment = _sample_moment()
+    batch = 10_000
+    for start in range(0, records, batch):
+        target.append_nowait(*[("moment", event_id, dict(moment, id=str(i)))
+                               for i in range(start, min(records, start + batch))])
+    target.close()
+    journal_bytes = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+
+    started = time.perf_counter()
+    state = Journal(directory).recover()
+    journal_replay = time.perf_counter() - started
+    assert len(state["moments"][event_id]) == records
+
+    target = Journal(directory, snapshot_interval=3600)
+    target.recover()
+    target.open()
+    compaction_s, compaction_stall = asyncio.run(_loop_stall(target.snapshot))
+    assert target.stats["snapshots"] == 1, target.stats
+    for i in range(tail):
+        target.append_nowait(("moment", event_id, dict(moment, id=f"tail-{i}")))
+    target.close()
+    snapshot_bytes = sum(os.path.getsize(os.path.join(directory, f))
+                         for f in os.listdir(directory) if f.startswith("snapshot-"))
+
+    started = time.perf_counter()
+    state = Journal(directory).recover()
+    snapshot_replay = time.perf_counter() - started
+    assert len(state["moments"][event_id]) == records + tail
+
+    return {
+        "records": records,
+        "journal_bytes": journal_bytes,
+        "journal_replay_s": round(journal_replay, 3),
+        "snapshot_bytes": snapshot_bytes,
+        "compaction_s": round(compaction_s, 3),
+        "compaction_loop_stall_ms": round(compaction_stall * 1000, 1),
+        "snapshot_plus_tail_s": round(snapshot_replay, 3),
+        "tail_records": tail,
+    }
+
+
+async def _latency_impact(directory: str, scale: str, scenarios, concurrency: int) -> dict:
+    """Run the request scenarios with the journal disabled and then with durable group commit
+
+    The app lifespan recovers and opens the journal when it is enabled, so only the flag is toggled here.
+    A discarded warm-up run first pays the one-off costs, such as creating upload shard directories.
+    """
+    results = {}
+    journal.directory = directory
+    enabled = api.JOURNAL_ENABLED
+    try:
+        for mode in ("warmup", "off", "group_commit"):
+            api.JOURNAL_ENABLED = mode == "group_commit"
+            print(f"-- journal {mode}")
+            records = journal.stats["records"]
+            report = await run_suite(scenarios, scale, "asgi", concurrency, None)
+            report["journal_stats"] = dict(journal.stats, records=journal.stats["records"] - records)
+            if mode != "warmup":
+                results[mode] = report
+    finally:
+        api.JOURNAL_ENABLED = enabled
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="SuperMoment journal benchmarks")
+    parser.add_argument("--records", type=int, default=1_000_000, help="Records to recover")
+    parser.add_argument("--tail", type=int, default=10_000, help="Journal records written after the snapshot")
+    parser.add_argument("--operations", type=int, default=2_000, help="Mutations per write amplification run")
+    parser.add_argument("--scale", default="tiny", help="Dataset scale for the latency comparison")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--output", help="Where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="supermoment-journal-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        amplification = asyncio.run(_write_amplification(os.path.join(workdir, "amplification"), args.operations))
+        for kind, numbers in amplification.items():
+            print(f"{kind:<16} {numbers}")
+        recovery = _recovery(os.path.join(workdir, "recovery"), args.records, args.tail)
+        print(f"recovery         {recovery}")
+        latency = asyncio.run(_latency_impact(
+            os.path.join(workdir, "latency"), args.scale, ["redeem_burst", "upload_small"], args.concurrency
+        ))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-journal.json")
+    with open(output, "w") as f:
+        json.dump({"write_amplification": amplification, "recovery": recovery, "latency": latency}, f, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
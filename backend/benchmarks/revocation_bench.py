@@ -0,0 +1,116 @@
+"""
+Token revocation benchmark: per-request overhead of the revocation check at 1M revoked tokens
+Usage (from backend/): python -m benchmarks.revocation_bench --revoked 1000000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from jose import jwt
+
+import auth
+from benchmarks.run import RESULTS_DIR
+from revocation import RevocationList
+
+
+def _per_call_us(func, args_list, repeat: int = 5) -> float:
+    """Best of `repeat` runs, in microseconds per call"""
+    return _interleaved_us([func], args_list, repeat)[0]
+
+
+def _interleaved_us(funcs, args_list, repeat: int = 5) -> list:
+    """Best of `repeat` rounds per function, in microseconds per call
+
+    Each round runs every function once in turn, so drift in machine load hits them alike.
+    """
+    best = [float("inf")] * len(funcs)
+    for _ in range(repeat):
+        for i, func in enumerate(funcs):
+            started = time.perf_counter()
+            for args in args_list:
+                func(*args)
+            best[i] = min(best[i], time.perf_counter() - started)
+    return [seconds / len(args_list) * 1e6 for seconds in best]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="SuperMoment token revocation benchmark")
+    parser.add_argument("--revoked", type=int, default=1_000_000)
+    parser.add_argument("--checks", type=int, default=50_000)
+    parser.add_argument("--output", help="Where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    now = int(time.time())
+    lifetime = auth.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+    # Revoked tokens spread evenly over the live token lifetime
+    started = time.perf_counter()
+    revocations = RevocationList()
+    for i in range(args.revoked):
+        revocations.add(uuid.uuid4().hex, now + 1 + (i * lifetime) // args.revoked, now)
+    build_s = time.perf_counter() - started
+    exact_mb = sum(sys.getsizeof(bucket) + sum(sys.getsizeof(jti) for jti in bucket)
+                   for bucket in revocations.buckets.values()) / 1024 / 1024
+
+    live = [(uuid.uuid4().hex, now + 1 + (i * lifetime) // args.checks) for i in range(args.checks)]
+    revoked_sample = [(jti, exp) for bucket in revocations.buckets.values()
+                      for jti, exp in list(bucket.items())[:args.checks // len(revocations.buckets)]]
+
+    results = {
+        "revoked": len(revocations),
+        "buckets": len(revocations.buckets),
+        "build_s": round(build_s, 3),
+        "exact_set_mb": round(exact_mb, 1),
+        "check_live_us": round(_per_call_us(revocations.is_revoked, live), 3),
+        "check_revoked_us": round(_per_call_us(revocations.is_revoked, revoked_sample), 3),
+    }
+
+    # Whole verify_token with and without the revocation check in front of it
+    users = list(auth.users_db)
+    tokens = [(auth.create_access_token({"sub": users[i % len(users)]}, timedelta(minutes=30)),)
+              for i in range(args.checks // 5)]
+    original = auth.revocations
+    empty = RevocationList()
+
+    def verify_with(revocation_list):
+        def verify(token):
+            auth.revocations = revocation_list
+            return auth.verify_token(token)
+        return verify
+    try:
+        decode_only, verify_empty, verify_loaded = _interleaved_us([
+            lambda token: jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]),
+            verify_with(empty),
+            verify_with(revocations),
+        ], tokens, repeat=10)
+    finally:
+        auth.revocations = original
+    # First check after every bucket's window has passed
+    started = time.perf_counter()
+    revocations._purge(now + 2 * lifetime)
+    results["purge_all_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    results.update({
+        "jwt_decode_us": round(decode_only, 3),
+        "verify_token_no_revocations_us": round(verify_empty, 3),
+        "verify_token_with_revocations_us": round(verify_loaded, 3),
+        "overhead_pct": round((verify_loaded - verify_empty) / verify_empty * 100, 2),
+    })
+    for key, value in results.items():
+        print(f"{key:<34} {value}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-revocation.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
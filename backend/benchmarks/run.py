@@ -0,0 +1,185 @@
+"""
+Benchmark runner
+Usage (from backend/): python -m benchmarks.run --scale small --transport asgi
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.datasets import SCALES, build_dataset
+from benchmarks.scenarios import DEFAULT_REQUESTS, SCENARIOS
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+
+@contextlib.asynccontextmanager
+async def asgi_client():
+    """Client that calls the app in-process through the ASGI transport
+
+    ASGITransport does not send lifespan events, so startup and shutdown run here as uvicorn would run them.
+    """
+    from main import app
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            yield client
+
+
+@contextlib.asynccontextmanager
+async def uvicorn_client():
+    """Client that talks to the app served by a local uvicorn in a background thread"""
+    import uvicorn
+    from main import app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    limits = httpx.Limits(max_connections=256, max_keepalive_connections=256)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=300) as client:
+            yield client
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+TRANSPORTS = {"asgi": asgi_client, "uvicorn": uvicorn_client}
+
+
+async def run_suite(scenarios: List[str], scale: str, transport: str,
+                    concurrency: int, requests: Optional[int]) -> Dict:
+    """Seed a dataset and run the selected scenarios in order"""
+    seed_started = time.perf_counter()
+    dataset = build_dataset(scale)
+    seed_time = time.perf_counter() - seed_started
+
+    results = {}
+    async with TRANSPORTS[transport]() as client:
+        for name in scenarios:
+            count = requests or DEFAULT_REQUESTS[name]
+            result = await SCENARIOS[name](client, dataset, count, concurrency)
+            results[name] = result.summary()
+            print(format_row(name, results[name]), flush=True)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "scale": scale,
+            "sizes": SCALES[scale],
+            "transport": transport,
+            "concurrency": concurrency,
+            "seed_time_s": round(seed_time, 3),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "scenarios": results,
+    }
+
+
+def format_row(name: str, summary: Dict) -> str:
+    """Render one scenario summary as a table row"""
+    return (f"{name:<16} {summary['requests']:>7} req {summary['errors']:>5} err "
+            f"{summary['throughput_rps']:>10.1f} req/s  p50 {summary['p50_ms']:>9.2f} ms  "
+            f"p99 {summary['p99_ms']:>9.2f} ms")
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """List the scenarios whose p50/p99 or throughput regressed beyond the tolerance"""
+    regressions = []
+    for name, summary in current["scenarios"].items():
+        reference = baseline.get("scenarios", {}).get(name)
+        if not reference:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if reference[metric] and summary[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {reference[metric]} -> {summary[metric]}")
+        if reference["throughput_rps"] and summary["throughput_rps"] < reference["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput_rps {reference['throughput_rps']} -> {summary['throughput_rps']}"
+            )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="SuperMoment API benchmark suite")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--transport", choices=sorted(TRANSPORTS), default="asgi")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable, default: all)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, help="Override the per-scenario request count")
+    parser.add_argument("--output", help="Where to write the JSON results")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--keep-uploads", action="store_true", help="Keep the uploaded files after the run")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    scenarios = args.scenario or list(SCENARIOS)
+
+    # Uploads are written relative to the working directory; keep them out of the tree
+    workdir = tempfile.mkdtemp(prefix="supermoment-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        report = asyncio.run(run_suite(scenarios, args.scale, args.transport, args.concurrency, args.requests))
+    finally:
+        os.chdir(cwd)
+        if not args.keep_uploads:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{args.scale}-{args.transport}.json"
+    )
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline stored at {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if (baseline["meta"]["scale"], baseline["meta"]["transport"]) != (args.scale, args.transport):
+            print("Baseline was recorded with a different scale/transport, skipping comparison")
+            return 0
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
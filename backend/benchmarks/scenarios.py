@@ -0,0 +1,182 @@
+"""
+Benchmark scenarios
+Each scenario issues a burst of requests against the API and records per-request latency
+"""
+
+import asyncio
+import itertools
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+
+from benchmarks.datasets import BENCH_PASSWORD, Dataset
+
+UPLOAD_SIZES = {
+    "upload_small": 16 * 1024,
+    "upload_medium": 512 * 1024,
+    "upload_large": 8 * 1024 * 1024,
+}
+
+
+@dataclass
+class ScenarioResult:
+    """Raw measurements of one scenario run"""
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    wall_time: float = 0.0
+
+    def percentile(self, pct: float) -> float:
+        """Nearest-rank percentile of the recorded latencies, in milliseconds"""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+        return ordered[rank] * 1000
+
+    def summary(self) -> Dict[str, float]:
+        """Summarize the run as throughput and latency figures"""
+        count = len(self.latencies)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "wall_time_s": round(self.wall_time, 4),
+            "throughput_rps": round(count / self.wall_time, 2) if self.wall_time else 0.0,
+            "mean_ms": round(sum(self.latencies) / count * 1000, 3) if count else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p99_ms": round(self.percentile(99), 3),
+        }
+
+
+RequestFactory = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+async def drive(name: str, client: httpx.AsyncClient, make_request: RequestFactory,
+                requests: int, concurrency: int) -> ScenarioResult:
+    """Issue `requests` calls with at most `concurrency` in flight"""
+    result = ScenarioResult(name=name)
+    counter = itertools.count()
+
+    async def worker():
+        while True:
+            i = next(counter)
+            if i >= requests:
+                return
+            started = time.perf_counter()
+            try:
+                response = await make_request(client, i)
+                if response.status_code >= 400:
+                    result.errors += 1
+            except httpx.HTTPError:
+                result.errors += 1
+            result.latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.wall_time = time.perf_counter() - started
+    return result
+
+
+def _auth(dataset: Dataset, email: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {dataset.tokens[email]}"}
+
+
+async def login_storm(client, dataset, requests, concurrency):
+    """Many users logging in at the same time (bcrypt bound)"""
+    async def call(client, i):
+        email = dataset.user_emails[i % len(dataset.user_emails)]
+        return await client.post("/auth/login", json={"email": email, "password": BENCH_PASSWORD})
+    return await drive("login_storm", client, call, requests, concurrency)
+
+
+async def redeem_burst(client, dataset, requests, concurrency):
+    """Guests redeeming distinct voucher codes right as an event opens"""
+    async def call(client, i):
+        email = dataset.user_emails[i % len(dataset.user_emails)]
+        code = dataset.voucher_codes[i % len(dataset.voucher_codes)]
+        return await client.post(
+            "/vouchers/redeem",
+            json={"voucher_code": code, "user_email": email},
+            headers=_auth(dataset, email)
+        )
+    return await drive("redeem_burst", client, call, requests, concurrency)
+
+
+async def moment_polling(client, dataset, requests, concurrency):
+    """Clients polling the moment feed of the busiest event"""
+    async def call(client, i):
+        params = {}
+        if i % 2:
+            params["user_id"] = dataset.user_emails[i % len(dataset.user_emails)]
+        return await client.get(f"/events/{dataset.hot_event_id}/moments", params=params)
+    return await drive("moment_polling", client, call, requests, concurrency)
+
+
+async def event_listing(client, dataset, requests, concurrency):
+    """Participants and admins listing their events"""
+    async def call(client, i):
+        if i % 4 == 0:
+            return await client.get("/events", params={"admin_only": "true"},
+                                    headers=_auth(dataset, dataset.admin_email))
+        email = dataset.user_emails[i % len(dataset.user_emails)]
+        return await client.get("/events", headers=_auth(dataset, email))
+    return await drive("event_listing", client, call, requests, concurrency)
+
+
+def make_upload_scenario(name: str, size: int):
+    """Build an upload scenario sending files of a fixed size"""
+    async def upload(client, dataset, requests, concurrency):
+        payload = os.urandom(size)
+
+        async def call(client, i):
+            email = dataset.user_emails[i % len(dataset.user_emails)]
+            event_id = dataset.event_ids[i % len(dataset.event_ids)]
+            return await client.post(
+                f"/events/{event_id}/upload",
+                files={"file": (f"bench-{i}.jpg", payload, "image/jpeg")},
+                data={"latitude": "44.81", "longitude": "20.46", "timestamp": "2025-01-01T20:00:00"},
+                headers=_auth(dataset, email)
+            )
+        return await drive(name, client, call, requests, concurrency)
+    upload.__doc__ = f"Uploads of {size // 1024} KiB files spread across events"
+    return upload
+
+
+async def upload_overload(client, dataset, requests, concurrency):
+    """Far more concurrent uploads than the admission cap; rejected requests should fail fast"""
+    payload = os.urandom(UPLOAD_SIZES["upload_medium"])
+
+    async def call(client, i):
+        email = dataset.user_emails[i % len(dataset.user_emails)]
+        return await client.post(
+            f"/events/{dataset.hot_event_id}/upload",
+            files={"file": (f"overload-{i}.jpg", payload, "image/jpeg")},
+            data={"latitude": "44.81", "longitude": "20.46", "timestamp": "2025-01-01T20:00:00"},
+            headers=_auth(dataset, email)
+        )
+    return await drive("upload_overload", client, call, requests, max(concurrency, 256))
+
+
+SCENARIOS = {
+    "login_storm": login_storm,
+    "redeem_burst": redeem_burst,
+    "moment_polling": moment_polling,
+    "event_listing": event_listing,
+    "upload_overload": upload_overload,
+}
+SCENARIOS.update({name: make_upload_scenario(name, size) for name, size in UPLOAD_SIZES.items()})
+
+# Default request counts; bcrypt and 1M-moment responses are expensive per call
+DEFAULT_REQUESTS = {
+    "login_storm": 50,
+    "redeem_burst": 500,
+    "moment_polling": 20,
+    "event_listing": 200,
+    "upload_small": 500,
+    "upload_medium": 200,
+    "upload_large": 20,
+    "upload_overload": 1000,
+}
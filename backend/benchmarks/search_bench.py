@@ -0,0 +1,110 @@
+"""
+Search index benchmark: build time, memory, incremental updates and query latency
+Usage (from backend/): python -m benchmarks.search_bench --events 100000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.run import RESULTS_DIR
+from search import SearchIndex
+
+WORDS = (
+    "svadba rodjendan proslava koncert zurka festival zabava vecera konferencija sastanak "
+    "maturska godisnjica krstenje slava docek izlozba turnir trka maraton radionica "
+    "beograd novi sad nis kragujevac subotica cacak kraljevo zlatibor kopaonik palic "
+    "splav hotel restoran sala basta klub park trg arena stadion galerija muzej "
+    "ana marko jelena nikola milica stefan ivana luka teodora petar sara filip "
+    "leto zima prolece jesen subota nedelja veceras muzika ples torta foto video gosti"
+).split()
+
+QUERIES = ["svadba", "beograd", "koncert beograd", "sv", "ko", "mar", "rodjendan ana", "splav zurka leto",
+           "festival", "nonexistent"]
+
+
+def _document(rng: random.Random, serial: int) -> dict:
+    return {
+        "title": " ".join(rng.choices(WORDS, k=rng.randint(2, 5))) + f" {serial}",
+        "description": " ".join(rng.choices(WORDS, k=rng.randint(0, 30))),
+        "location": " ".join(rng.choices(WORDS[20:40], k=rng.randint(1, 3))),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="SuperMoment search index benchmark")
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per query")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    documents = [(f"event-{i}", _document(rng, i)) for i in range(args.events)]
+
+    index = SearchIndex()
+    tracemalloc.start()
+    started = time.perf_counter()
+    for key, fields in documents:
+        index.add(key, fields)
+    build_s = time.perf_counter() - started
+    memory_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+    tracemalloc.stop()
+
+    # Build time without tracemalloc overhead
+    started = time.perf_counter()
+    rebuilt = SearchIndex()
+    for key, fields in documents:
+        rebuilt.add(key, fields)
+    results = {
+        "events": args.events,
+        "terms": len(index.terms),
+        "build_s": round(time.perf_counter() - started, 3),
+        "build_traced_s": round(build_s, 3),
+        "memory_mb": round(memory_mb, 1),
+    }
+    del rebuilt
+
+    updates = [(f"event-{rng.randrange(args.events)}", _document(rng, i)) for i in range(1000)]
+    started = time.perf_counter()
+    for key, fields in updates:
+        index.add(key, fields)
+    results["update_us"] = round((time.perf_counter() - started) / len(updates) * 1e6, 2)
+
+    results["queries"] = {}
+    for query in QUERIES:
+        timings, top_timings = [], []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            matches = index.search(query)
+            started_top = time.perf_counter()
+            index.search(query, limit=20)
+            top_timings.append((time.perf_counter() - started_top) * 1000)
+            timings.append((started_top - started) * 1000)
+        results["queries"][query] = row = {
+            "matches": len(matches),
+            "p50_ms": round(statistics.median(timings), 3),
+            "max_ms": round(max(timings), 3),
+            "top20_p50_ms": round(statistics.median(top_timings), 3),
+        }
+        print(f"{query!r:<22} {row}", flush=True)
+
+    for key in ("events", "terms", "build_s", "build_traced_s", "memory_mb", "update_us"):
+        print(f"{key:<22} {results[key]}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-search.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
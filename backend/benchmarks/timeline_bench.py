@@ -0,0 +1,111 @@
+"""
+Timeline benchmark: histogram latency over a 1M-moment event vs bucketing the moments list in Python
+Usage (from backend/): python -m benchmarks.timeline_bench --moments 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.run import RESULTS_DIR
+from timeline import EventTimeline, TIMELINE_MAX_BUCKETS
+
+# (resolution seconds, max buckets, with contributors)
+QUERIES = [(1, TIMELINE_MAX_BUCKETS, False), (60, 1000, False), (60, 1000, True), (1, 500, True)]
+
+
+def python_histogram(moments: list, start: float, resolution: float, buckets: int) -> list:
+    counts = [0] * buckets
+    for moment in moments:
+        index = int((moment["at"] - start) // resolution)
+        if 0 <= index < buckets:
+            counts[index] += 1
+    return counts
+
+
+def _p50_ms(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="SuperMoment timeline histogram benchmark")
+    parser.add_argument("--moments", type=int, default=1_000_000)
+    parser.add_argument("--hours", type=float, default=6, help="How long the event runs")
+    parser.add_argument("--guests", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    start = datetime(2025, 1, 1, 20).timestamp()
+    duration = args.hours * 3600
+    # Uploads arrive roughly in capture order, with some phones reporting late
+    moments = [
+        {"at": start + i * duration / args.moments - (rng.expovariate(1 / 30) if rng.random() < 0.05 else 0),
+         "user_id": f"guest-{rng.randrange(args.guests)}@example.com"}
+        for i in range(args.moments)
+    ]
+
+    started = time.perf_counter()
+    timeline = EventTimeline()
+    for moment in moments:
+        timeline.add(moment["at"], moment["user_id"])
+    results = {"moments": args.moments, "incremental_add_us": round((time.perf_counter() - started) / args.moments * 1e6, 3)}
+
+    started = time.perf_counter()
+    bulk = EventTimeline()
+    bulk.extend((moment["at"] for moment in moments), (moment["user_id"] for moment in moments))
+    results["bulk_load_s"] = round(time.perf_counter() - started, 3)
+    if (bulk.times[:bulk.size] != timeline.times[:timeline.size]).any():
+        print("incremental and bulk timelines differ", file=sys.stderr)
+        return 1
+
+    results["queries"] = []
+    for resolution, max_buckets, contributors in QUERIES:
+        histogram = timeline.histogram(None, None, resolution, max_buckets, contributors)
+        row = {
+            "resolution": resolution,
+            "max_buckets": max_buckets,
+            "contributors": contributors,
+            "buckets": len(histogram["counts"]),
+            "numpy_ms": round(_p50_ms(lambda: timeline.histogram(None, None, resolution, max_buckets, contributors),
+                                      args.repeat), 3),
+        }
+        if not contributors:
+            expected = python_histogram(moments, histogram["start"], histogram["resolution"], len(histogram["counts"]))
+            if expected != histogram["counts"]:
+                print(f"histogram at {resolution}s differs from the Python reference", file=sys.stderr)
+                return 1
+            row["python_ms"] = round(_p50_ms(lambda: python_histogram(
+                moments, histogram["start"], histogram["resolution"], len(histogram["counts"])), 3), 3)
+        results["queries"].append(row)
+        print(row, flush=True)
+
+    # A scrubber zoomed into one minute
+    window_start = start + duration / 2
+    results["one_minute_window_ms"] = round(
+        _p50_ms(lambda: timeline.histogram(window_start, window_start + 60, 1, 60, True), args.repeat), 3)
+    for key in ("moments", "incremental_add_us", "bulk_load_s", "one_minute_window_ms"):
+        print(f"{key:<22} {results[key]}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-timeline.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
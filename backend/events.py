@@ -5,10 +5,18 @@ Handles events, vouchers, and participant management
 
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
+import os
+import time
 import uuid
 import random
 import string
 from fastapi import HTTPException, status
+from profiling import traced
+from journal import journal
+from scheduler import scheduler, to_timestamp
+from geo import geo_index
+from search import search_index
+from analytics import analytics
 from models import Event, EventCreate, EventUpdate, EventStatus, EventList
 from models import Voucher, VoucherCreate, VoucherUpdate, VoucherStatus, VoucherList, VoucherRedeem, VoucherRedeemResponse
 
@@ -17,6 +25,71 @@ events_db: Dict[str, Event] = {}
 vouchers_db: Dict[str, Voucher] = {}
 event_participants: Dict[str, List[str]] = {}  # event_id -> list of user emails
 
+# Active events are marked completed this long after their event_date
+EVENT_COMPLETE_AFTER_HOURS = int(os.getenv("EVENT_COMPLETE_AFTER_HOURS", "24"))
+
+def event_completes_at(event: Event) -> datetime:
+    """When an active event is automatically marked completed"""
+    return event.event_date + timedelta(hours=EVENT_COMPLETE_AFTER_HOURS)
+
+def schedule_event(event: Event):
+    """Schedule or cancel the automatic completion of an event"""
+    if event.status == EventStatus.ACTIVE:
+        scheduler.schedule("event_completion", event.id, event_completes_at(event))
+    else:
+        scheduler.cancel("event_completion", event.id)
+
+def schedule_voucher(voucher: Voucher):
+    """Schedule or cancel the automatic expiry of a voucher"""
+    if voucher.status == VoucherStatus.ACTIVE and voucher.expires_at:
+        scheduler.schedule("voucher_expiry", voucher.id, voucher.expires_at)
+    else:
+        scheduler.cancel("voucher_expiry", voucher.id)
+
+async def complete_event(event_id: str):
+    """Scheduler handler: mark an active event completed once it is over"""
+    event = events_db.get(event_id)
+    if not event or event.status != EventStatus.ACTIVE:
+        return
+    if to_timestamp(event_completes_at(event)) > time.time():
+        schedule_event(event)
+        return
+    event.status = EventStatus.COMPLETED
+    event.updated_at = datetime.utcnow()
+    await journal.append(("event", event_id, event.model_dump()))
+
+async def expire_voucher(voucher_id: str):
+    """Scheduler handler: mark an active voucher expired once expires_at passes"""
+    voucher = vouchers_db.get(voucher_id)
+    if not voucher or voucher.status != VoucherStatus.ACTIVE or not voucher.expires_at:
+        return
+    if to_timestamp(voucher.expires_at) > time.time():
+        schedule_voucher(voucher)
+        return
+    voucher.status = VoucherStatus.EXPIRED
+    await journal.append(("voucher", voucher_id, voucher.model_dump()))
+
+def index_event(event: Event):
+    """Add or refresh an event in the search index"""
+    search_index.add(event.id, {"title": event.title, "description": event.description, "location": event.location})
+
+scheduler.register("event_completion", complete_event)
+scheduler.register("voucher_expiry", expire_voucher)
+
+def restore_state(state: dict):
+    """Load events, participants and vouchers recovered from the journal"""
+    for event_id, data in state["events"].items():
+        events_db[event_id] = Event.model_construct(**data)
+        schedule_event(events_db[event_id])
+        geo_index.add(event_id, data.get("latitude"), data.get("longitude"))
+        index_event(events_db[event_id])
+    for event_id, participants in state["participants"].items():
+        event_participants[event_id] = participants
+    for voucher_id, data in state["vouchers"].items():
+        vouchers_db[voucher_id] = voucher = Voucher.model_construct(**data)
+        schedule_voucher(voucher)
+        analytics.track_voucher(voucher.event_id, voucher_id, voucher.code, voucher.max_uses, voucher.used_count)
+
 def generate_voucher_code() -> str:
     """Generate a unique voucher code"""
     while True:
@@ -26,6 +99,7 @@ def generate_voucher_code() -> str:
         if not any(v.code == code for v in vouchers_db.values()):
             return code
 
+@traced("store")
 async def create_event(event_data: EventCreate, admin_email: str) -> Event:
     """Create a new event"""
     event_id = str(uuid.uuid4())
@@ -50,21 +124,72 @@ async def create_event(event_data: EventCreate, admin_email: str) -> Event:
     
     events_db[event_id] = event
     event_participants[event_id] = [admin_email]  # Admin is automatically a participant
+    schedule_event(event)
+    geo_index.add(event_id, event.latitude, event.longitude)
+    index_event(event)
+    
+    await journal.append(
+        ("event", event_id, event.model_dump()),
+        ("participants", event_id, [admin_email])
+    )
     
     return event
 
+@traced("store")
 async def get_event(event_id: str) -> Optional[Event]:
     """Get event by ID"""
     return events_db.get(event_id)
 
+@traced("store")
 async def get_events_by_admin(admin_email: str) -> List[Event]:
     """Get all events created by admin"""
     return [event for event in events_db.values() if event.admin_email == admin_email]
 
+@traced("store")
 async def get_all_events() -> List[Event]:
     """Get all events"""
     return list(events_db.values())
 
+@traced("store")
+async def get_nearby_events(latitude: float, longitude: float, radius_km: float, user_email: str,
+                            status: Optional[EventStatus] = None, date_from: Optional[datetime] = None,
+                            date_to: Optional[datetime] = None, limit: int = 50) -> List[tuple]:
+    """Get (distance_km, event) pairs within a radius, nearest first; drafts only for their admin"""
+    # Compare as timestamps so naive and timezone-aware datetimes can be mixed
+    start = to_timestamp(date_from) if date_from else None
+    end = to_timestamp(date_to) if date_to else None
+    nearby = []
+    for distance, event_id in geo_index.nearby(latitude, longitude, radius_km):
+        event = events_db.get(event_id)
+        if event is None:
+            continue
+        if status is not None and event.status != status:
+            continue
+        if event.status == EventStatus.DRAFT and event.admin_email != user_email:
+            continue
+        if start is not None or end is not None:
+            event_at = to_timestamp(event.event_date)
+            if (start is not None and event_at < start) or (end is not None and event_at > end):
+                continue
+        nearby.append((distance, event))
+        if len(nearby) >= limit:
+            break
+    return nearby
+
+@traced("store")
+async def search_events(query: str, user_email: str, user_role: str, limit: int = 20) -> List[Event]:
+    """Search events by title, description and location, best match first
+
+    Admins see every event; other users only events they take part in.
+    """
+    def visible(event_id: str) -> bool:
+        return event_id in events_db and (
+            user_role == "admin" or user_email in event_participants.get(event_id, ())
+        )
+
+    return [events_db[event_id] for _, event_id in search_index.search(query, limit, visible)]
+
+@traced("store")
 async def update_event(event_id: str, event_data: EventUpdate, admin_email: str) -> Event:
     """Update an event"""
     if event_id not in events_db:
@@ -89,9 +214,18 @@ async def update_event(event_id: str, event_data: EventUpdate, admin_email: str)
     
     event.updated_at = datetime.utcnow()
     events_db[event_id] = event
+    if "event_date" in update_data or "status" in update_data:
+        schedule_event(event)
+    if "latitude" in update_data or "longitude" in update_data:
+        geo_index.add(event_id, event.latitude, event.longitude)
+    if update_data.keys() & {"title", "description", "location"}:
+        index_event(event)
+    
+    await journal.append(("event", event_id, event.model_dump()))
     
     return event
 
+@traced("store")
 async def delete_event(event_id: str, admin_email: str) -> bool:
     """Delete an event"""
     if event_id not in events_db:
@@ -111,6 +245,10 @@ async def delete_event(event_id: str, admin_email: str) -> bool:
     
     # Delete event and related data
     del events_db[event_id]
+    scheduler.cancel("event_completion", event_id)
+    geo_index.remove(event_id)
+    search_index.remove(event_id)
+    analytics.forget_event(event_id)
     if event_id in event_participants:
         del event_participants[event_id]
     
@@ -118,9 +256,17 @@ async def delete_event(event_id: str, admin_email: str) -> bool:
     vouchers_to_delete = [v_id for v_id, voucher in vouchers_db.items() if voucher.event_id == event_id]
     for v_id in vouchers_to_delete:
         del vouchers_db[v_id]
+        scheduler.cancel("voucher_expiry", v_id)
+    
+    await journal.append(
+        ("event", event_id, None),
+        ("participants", event_id, None),
+        *[("voucher", v_id, None) for v_id in vouchers_to_delete]
+    )
     
     return True
 
+@traced("store")
 async def create_voucher(voucher_data: VoucherCreate, admin_email: str) -> Voucher:
     """Create a new voucher for an event"""
     # Check if event exists
@@ -151,8 +297,12 @@ async def create_voucher(voucher_data: VoucherCreate, admin_email: str) -> Vouch
     )
     
     vouchers_db[voucher_id] = voucher
+    schedule_voucher(voucher)
+    analytics.track_voucher(voucher.event_id, voucher_id, voucher.code, voucher.max_uses)
+    await journal.append(("voucher", voucher_id, voucher.model_dump()))
     return voucher
 
+@traced("store")
 async def get_voucher_by_code(code: str) -> Optional[Voucher]:
     """Get voucher by code"""
     for voucher in vouchers_db.values():
@@ -160,6 +310,7 @@ async def get_voucher_by_code(code: str) -> Optional[Voucher]:
             return voucher
     return None
 
+@traced("store")
 async def get_vouchers_by_event(event_id: str, admin_email: str) -> List[Voucher]:
     """Get all vouchers for an event"""
     # Check if user is admin of this event
@@ -172,6 +323,7 @@ async def get_vouchers_by_event(event_id: str, admin_email: str) -> List[Voucher
     
     return [v for v in vouchers_db.values() if v.event_id == event_id]
 
+@traced("store")
 async def redeem_voucher(voucher_code: str, user_email: str) -> VoucherRedeemResponse:
     """Redeem a voucher for event participation"""
     voucher = await get_voucher_by_code(voucher_code)
@@ -182,6 +334,12 @@ async def redeem_voucher(voucher_code: str, user_email: str) -> VoucherRedeemRes
             message="Invalid voucher code"
         )
     
+    response = await apply_redemption(voucher, user_email)
+    analytics.record_redemption(voucher.event_id, voucher.id, response.success)
+    return response
+
+async def apply_redemption(voucher: Voucher, user_email: str) -> VoucherRedeemResponse:
+    """Check a voucher's limits and add the user to its event"""
     # Check if voucher is active
     if voucher.status != VoucherStatus.ACTIVE:
         return VoucherRedeemResponse(
@@ -192,6 +350,8 @@ async def redeem_voucher(voucher_code: str, user_email: str) -> VoucherRedeemRes
     # Check if voucher has expired
     if voucher.expires_at and voucher.expires_at < datetime.utcnow():
         voucher.status = VoucherStatus.EXPIRED
+        schedule_voucher(voucher)
+        await journal.append(("voucher", voucher.id, voucher.model_dump()))
         return VoucherRedeemResponse(
             success=False,
             message="Voucher has expired"
@@ -200,6 +360,8 @@ async def redeem_voucher(voucher_code: str, user_email: str) -> VoucherRedeemRes
     # Check if voucher usage limit reached
     if voucher.used_count >= voucher.max_uses:
         voucher.status = VoucherStatus.USED
+        schedule_voucher(voucher)
+        await journal.append(("voucher", voucher.id, voucher.model_dump()))
         return VoucherRedeemResponse(
             success=False,
             message="Voucher usage limit reached"
@@ -240,6 +402,13 @@ async def redeem_voucher(voucher_code: str, user_email: str) -> VoucherRedeemRes
     voucher.used_count += 1
     if voucher.used_count >= voucher.max_uses:
         voucher.status = VoucherStatus.USED
+        schedule_voucher(voucher)
+    
+    await journal.append(
+        ("participant", voucher.event_id, user_email),
+        ("event", event.id, event.model_dump()),
+        ("voucher", voucher.id, voucher.model_dump())
+    )
     
     return VoucherRedeemResponse(
         success=True,
@@ -248,6 +417,7 @@ async def redeem_voucher(voucher_code: str, user_email: str) -> VoucherRedeemRes
         voucher=voucher
     )
 
+@traced("store")
 async def get_user_events(user_email: str) -> List[Event]:
     """Get all events where user is a participant"""
     user_events = []
@@ -0,0 +1,99 @@
+"""
+Geo Index
+Events bucketed into a fixed latitude/longitude grid for radius queries
+"""
+
+from typing import Dict, List, Optional, Tuple
+import math
+import os
+
+# Configuration
+GEO_CELL_DEGREES = float(os.getenv("GEO_CELL_DEGREES", "0.1"))
+GEO_MAX_RADIUS_KM = float(os.getenv("GEO_MAX_RADIUS_KM", "200"))
+EARTH_RADIUS_KM = 6371.0088
+
+Cell = Tuple[int, int]
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex:
+    """Grid of cells, each holding the positions of the events inside it
+
+    A radius query visits only the cells overlapping the query's bounding box,
+    so its cost follows the number of events nearby rather than the total.
+    """
+
+    def __init__(self, cell_degrees: float = GEO_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.columns = math.ceil(360 / cell_degrees)
+        self.cells: Dict[Cell, Dict[str, Tuple[float, float]]] = {}
+        self.cell_of: Dict[str, Cell] = {}
+
+    def _cell(self, latitude: float, longitude: float) -> Cell:
+        return (
+            math.floor((latitude + 90) / self.cell_degrees),
+            math.floor((longitude + 180) / self.cell_degrees) % self.columns
+        )
+
+    def add(self, key: str, latitude: Optional[float], longitude: Optional[float]):
+        """Index `key` at a position, moving it if already indexed; no position removes it"""
+        self.remove(key)
+        if latitude is None or longitude is None:
+            return
+        cell = self._cell(latitude, longitude)
+        self.cells.setdefault(cell, {})[key] = (latitude, longitude)
+        self.cell_of[key] = cell
+
+    def remove(self, key: str):
+        cell = self.cell_of.pop(key, None)
+        if cell is None:
+            return
+        bucket = self.cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self.cells[cell]
+
+    def _cells_within(self, latitude: float, longitude: float, radius_km: float):
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        south, north = max(-90.0, latitude - dlat), min(90.0, latitude + dlat)
+        # The longitude span widens towards the poles and covers everything past them
+        widest = max(abs(south), abs(north))
+        if north >= 90 or south <= -90 or math.cos(math.radians(widest)) * 180 <= dlat:
+            columns = range(self.columns)
+        else:
+            dlon = dlat / math.cos(math.radians(widest))
+            first = math.floor((longitude - dlon + 180) / self.cell_degrees)
+            last = math.floor((longitude + dlon + 180) / self.cell_degrees)
+            columns = [column % self.columns for column in range(first, min(last, first + self.columns - 1) + 1)]
+        first_row = math.floor((south + 90) / self.cell_degrees)
+        last_row = math.floor((north + 90) / self.cell_degrees)
+        for row in range(first_row, last_row + 1):
+            for column in columns:
+                bucket = self.cells.get((row, column))
+                if bucket:
+                    yield bucket
+
+    def nearby(self, latitude: float, longitude: float, radius_km: float) -> List[Tuple[float, str]]:
+        """(distance_km, key) pairs within `radius_km` of a point, nearest first"""
+        found = []
+        for bucket in self._cells_within(latitude, longitude, radius_km):
+            for key, (lat, lon) in bucket.items():
+                distance = haversine_km(latitude, longitude, lat, lon)
+                if distance <= radius_km:
+                    found.append((distance, key))
+        found.sort()
+        return found
+
+    def __len__(self) -> int:
+        return len(self.cell_of)
+
+
+geo_index = GeoIndex()
@@ -0,0 +1,397 @@
+"""
+Write-Ahead Journal
+Append-only log of store mutations with group-committed fsyncs and compacted snapshots
+"""
+
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import glob
+import os
+import pickle
+import struct
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+# Configuration
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "data")
+JOURNAL_ENABLED = os.getenv("JOURNAL_ENABLED", "1") == "1"
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "1") == "1"
+JOURNAL_DURABLE_ACK = os.getenv("JOURNAL_DURABLE_ACK", "1") == "1"
+JOURNAL_COMMIT_INTERVAL_MS = float(os.getenv("JOURNAL_COMMIT_INTERVAL_MS", "2"))
+JOURNAL_SEGMENT_MB = int(os.getenv("JOURNAL_SEGMENT_MB", "64"))
+JOURNAL_SNAPSHOT_SEGMENTS = int(os.getenv("JOURNAL_SNAPSHOT_SEGMENTS", "4"))
+JOURNAL_SNAPSHOT_INTERVAL = float(os.getenv("JOURNAL_SNAPSHOT_INTERVAL", "900"))
+
+# Each record is framed as <payload length, crc32 of payload> followed by a pickled tuple
+FRAME = struct.Struct("<II")
+SNAPSHOT_MAGIC = b"SMSNAP1\n"
+CREATED_MARKER = "created"
+TABLES = {"event": "events", "voucher": "vouchers", "user": "users",
+          "participants": "participants", "moments": "moments", "gc": "gc",
+          "revoked": "revoked"}
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+def empty_state() -> Dict[str, dict]:
+    """Plain-data image of every journaled store"""
+    return {"events": {}, "participants": {}, "vouchers": {}, "users": {}, "moments": {}, "gc": {}, "revoked": {}}
+
+
+def apply(state: Dict[str, dict], record: Tuple):
+    """Apply one journal record to a state image
+
+    Records are tuples: ("event" | "voucher" | "user", key, dict or None to delete),
+    ("participants", event_id, list or None), ("participant", event_id, email),
+    ("moment", event_id, moment dict), ("moments", event_id, None) to drop an event's moments
+    ("gc", task key, media removal task or None once done) and ("revoked", jti, exp or None).
+    """
+    kind, key, value = record
+    if kind == "participant":
+        state["participants"].setdefault(key, []).append(value)
+    elif kind == "moment":
+        state["moments"].setdefault(key, []).append(value)
+    else:
+        table = state.setdefault(TABLES[kind], {})
+        if value is None:
+            table.pop(key, None)
+        else:
+            table[key] = value
+
+
+def encode(records) -> bytes:
+    """Frame records for appending to a segment"""
+    frames = []
+    for record in records:
+        payload = pickle.dumps(record, PICKLE_PROTOCOL)
+        frames.append(FRAME.pack(len(payload), zlib.crc32(payload)))
+        frames.append(payload)
+    return b"".join(frames)
+
+
+def read_segment(path: str) -> Tuple[List[Tuple], int]:
+    """Decode a segment, stopping at the first torn or corrupt record; return records and the valid length"""
+    with open(path, "rb") as f:
+        data = f.read()
+    records, offset = [], 0
+    while offset + FRAME.size <= len(data):
+        length, crc = FRAME.unpack_from(data, offset)
+        start = offset + FRAME.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        records.append(pickle.loads(payload))
+        offset = start + length
+    return records, offset
+
+
+def _segment_seq(path: str) -> int:
+    return int(os.path.basename(path).split("-")[1].split(".")[0])
+
+
+def list_segments(directory: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(directory, "journal-*.log")), key=_segment_seq)
+
+
+def list_snapshots(directory: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(directory, "snapshot-*.bin")), key=_segment_seq)
+
+
+def load_snapshot(directory: str) -> Tuple[Dict[str, dict], int]:
+    """Newest intact snapshot and the segment it covers up to, falling back to older ones"""
+    for path in reversed(list_snapshots(directory)):
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(SNAPSHOT_MAGIC):
+            continue
+        length, crc = FRAME.unpack_from(data, len(SNAPSHOT_MAGIC))
+        payload = data[len(SNAPSHOT_MAGIC) + FRAME.size:]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            continue
+        return pickle.loads(payload), _segment_seq(path)
+    return empty_state(), 0
+
+
+def created_at(directory: str) -> float:
+    """When the journal in `directory` was started, writing the marker the first time
+
+    Anything older than this was never journaled, so the stores cannot vouch for it.
+    """
+    path = os.path.join(directory, CREATED_MARKER)
+    try:
+        with open(path) as f:
+            return float(f.read())
+    except (FileNotFoundError, ValueError):
+        pass
+    created = time.time()
+    with open(path + ".tmp", "w") as f:
+        f.write(repr(created))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+    _fsync_dir(directory)
+    return created
+
+
+def compact_directory(directory: str, sealed_seq: int) -> bool:
+    """Fold segments up to `sealed_seq` into a new snapshot and delete what it supersedes
+
+    Returns False when the newest snapshot already covers them.
+    """
+    state, covered = load_snapshot(directory)
+    if sealed_seq <= covered:
+        return False
+    for path in list_segments(directory):
+        seq = _segment_seq(path)
+        if covered < seq <= sealed_seq:
+            for record in read_segment(path)[0]:
+                apply(state, record)
+    # Revocations of tokens that have expired anyway are dropped here rather than deleted one by one
+    now = time.time()
+    state["revoked"] = {jti: exp for jti, exp in state.get("revoked", {}).items() if exp > now}
+
+    payload = pickle.dumps(state, PICKLE_PROTOCOL)
+    path = os.path.join(directory, f"snapshot-{sealed_seq:016d}.bin")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(FRAME.pack(len(payload), zlib.crc32(payload)))
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(directory)
+
+    for old in list_snapshots(directory):
+        if _segment_seq(old) < sealed_seq:
+            os.remove(old)
+    for old in list_segments(directory):
+        if _segment_seq(old) <= sealed_seq:
+            os.remove(old)
+    return True
+
+
+def _fsync_dir(directory: str):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """Append-only mutation journal; writes and fsyncs happen on a background thread"""
+
+    def __init__(self, directory: str = JOURNAL_DIR, fsync: bool = JOURNAL_FSYNC,
+                 durable_ack: bool = JOURNAL_DURABLE_ACK,
+                 commit_interval: float = JOURNAL_COMMIT_INTERVAL_MS / 1000,
+                 segment_bytes: int = JOURNAL_SEGMENT_MB * 1024 * 1024,
+                 snapshot_segments: int = JOURNAL_SNAPSHOT_SEGMENTS,
+                 snapshot_interval: float = JOURNAL_SNAPSHOT_INTERVAL):
+        self.directory = directory
+        self.fsync = fsync
+        self.durable_ack = durable_ack
+        self.commit_interval = commit_interval
+        self.segment_bytes = segment_bytes
+        self.snapshot_segments = snapshot_segments
+        self.snapshot_interval = snapshot_interval
+        self.is_open = False
+        self.created_at: Optional[float] = None
+
+        self.condition = threading.Condition()
+        self.pending: List[Tuple] = []
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self.closing = False
+        self.writer: Optional[threading.Thread] = None
+        self.compactor: Optional[threading.Thread] = None
+        self.compact_requested = threading.Event()
+        # segment_lock guards the open segment file, compaction_lock serializes snapshots
+        self.segment_lock = threading.Lock()
+        self.compaction_lock = threading.Lock()
+        self.segment = None
+        self.segment_seq = 0
+        self.stats = {"records": 0, "bytes": 0, "commits": 0, "fsyncs": 0, "snapshots": 0, "compaction_errors": 0}
+
+    # Recovery
+
+    def _segments(self) -> List[str]:
+        return list_segments(self.directory)
+
+    def recover(self) -> Dict[str, dict]:
+        """Load the newest snapshot and replay the journal tail written after it"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.created_at = created_at(self.directory)
+        state, covered = load_snapshot(self.directory)
+        last_seq = covered
+        for path in self._segments():
+            seq = _segment_seq(path)
+            last_seq = max(last_seq, seq)
+            if seq <= covered:
+                continue
+            records, valid_length = read_segment(path)
+            for record in records:
+                apply(state, record)
+            if valid_length < os.path.getsize(path):
+                # Drop a torn tail left by a crash mid-write
+                with open(path, "r+b") as f:
+                    f.truncate(valid_length)
+        self.segment_seq = last_seq
+        return state
+
+    # Writing
+
+    def open(self):
+        """Start a fresh segment and the writer and compactor threads"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.closing = False
+        self._rotate()
+        self.writer = threading.Thread(target=self._write_loop, name="journal-writer", daemon=True)
+        self.writer.start()
+        self.compactor = threading.Thread(target=self._compact_loop, name="journal-compactor", daemon=True)
+        self.compactor.start()
+        self.is_open = True
+
+    def close(self):
+        """Flush everything pending and stop the background threads"""
+        if not self.is_open:
+            return
+        self.is_open = False
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        self.writer.join()
+        self.compact_requested.set()
+        self.compactor.join()
+        self.segment.close()
+
+    def append_nowait(self, *records: Tuple):
+        """Queue records without waiting for them to reach disk"""
+        if not self.is_open or not records:
+            return
+        with self.condition:
+            self.pending.extend(records)
+            self.condition.notify()
+
+    async def append(self, *records: Tuple):
+        """Queue records and, with durable acks, wait for the group commit that covers them"""
+        if not self.is_open or not records:
+            return
+        if not self.durable_ack:
+            return self.append_nowait(*records)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.condition:
+            self.pending.extend(records)
+            self.waiters.append((loop, future))
+            self.condition.notify()
+        await future
+
+    def _rotate(self):
+        if self.segment is not None:
+            self.segment.close()
+        self.segment_seq += 1
+        path = os.path.join(self.directory, f"journal-{self.segment_seq:016d}.log")
+        self.segment = open(path, "ab")
+        _fsync_dir(self.directory)
+
+    def _write_loop(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closing:
+                    self.condition.wait()
+                if not self.pending and self.closing:
+                    return
+            # Let concurrent requests pile onto this commit
+            if self.commit_interval:
+                time.sleep(self.commit_interval)
+            with self.condition:
+                records, self.pending = self.pending, []
+                waiters, self.waiters = self.waiters, []
+
+            data = encode(records)
+            error = None
+            try:
+                with self.segment_lock:
+                    self.segment.write(data)
+                    self.segment.flush()
+                    if self.fsync:
+                        os.fsync(self.segment.fileno())
+                        self.stats["fsyncs"] += 1
+                    if self.segment.tell() >= self.segment_bytes:
+                        self._rotate()
+                        if len(self._segments()) > self.snapshot_segments:
+                            self.compact_requested.set()
+            except OSError as e:
+                error = e
+            else:
+                self.stats["records"] += len(records)
+                self.stats["bytes"] += len(data)
+                self.stats["commits"] += 1
+
+            for loop, future in waiters:
+                try:
+                    loop.call_soon_threadsafe(_resolve, future, error)
+                except RuntimeError:
+                    pass  # loop already closed
+
+    # Compaction
+
+    def _compact_loop(self):
+        while True:
+            requested = self.compact_requested.wait(timeout=self.snapshot_interval)
+            self.compact_requested.clear()
+            if self.closing:
+                return
+            if requested:
+                self.compact()
+            else:
+                self.snapshot()
+
+    def compact(self):
+        """Fold sealed segments into a new snapshot and delete what it supersedes
+
+        Unpickling and pickling the whole state hold the GIL for seconds on large
+        stores, so the work runs in a child process and this thread only waits.
+        """
+        with self.compaction_lock:
+            with self.segment_lock:
+                sealed_seq = self.segment_seq - 1
+            if sealed_seq <= 0:
+                return
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "compact", self.directory, str(sealed_seq)],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            if result.returncode != 0:
+                # The sealed segments stay in place, so nothing is lost; the next round retries
+                self.stats["compaction_errors"] += 1
+            elif result.stdout.strip() == b"compacted":
+                self.stats["snapshots"] += 1
+
+    def snapshot(self):
+        """Seal the current segment and compact everything up to it"""
+        with self.segment_lock:
+            if self.segment.tell():
+                self._rotate()
+        self.compact()
+
+
+def _resolve(future: asyncio.Future, error: Optional[Exception]):
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+journal = Journal()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "compact":
+        print("Usage: python journal.py compact <journal_dir> <sealed_segment_seq>")
+        sys.exit(2)
+    print("compacted" if compact_directory(sys.argv[2], int(sys.argv[3])) else "up to date")
@@ -1,23 +1,77 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, status
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, Query, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.concurrency import run_in_threadpool
 import os
 import json
-from datetime import datetime, timedelta
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional
-import aiofiles
 import uuid
 
-from auth import authenticate_user, create_access_token, verify_token, create_user, authenticate_apple_user, authenticate_google_user, ACCESS_TOKEN_EXPIRE_MINUTES
-from models import UserLogin, UserCreate, LoginResponse, RegisterResponse, User, AppleSignInRequest, GoogleSignInRequest, EventCreate, EventUpdate, EventList, Event, VoucherCreate, VoucherUpdate, VoucherList, VoucherRedeem, VoucherRedeemResponse, Voucher
-from events import create_event, get_event, get_events_by_admin, get_all_events, update_event, delete_event, create_voucher, get_vouchers_by_event, redeem_voucher, get_user_events
+from auth import users_db, revoke_token, authenticate_user, create_access_token, verify_token, create_user, authenticate_apple_user, authenticate_google_user, ACCESS_TOKEN_EXPIRE_MINUTES
+from models import UserLogin, UserCreate, LoginResponse, RegisterResponse, User, AppleSignInRequest, GoogleSignInRequest, EventCreate, EventUpdate, EventList, Event, EventStatus, NearbyEvent, NearbyEventList, VoucherCreate, VoucherUpdate, VoucherList, VoucherRedeem, VoucherRedeemResponse, Voucher
+from admission import AdmissionMiddleware, batch_max_files, charge_batch_files, upload_gate
+from profiling import ProfiledRoute, ProfilingMiddleware, span, create_profile_token, ring as profile_ring, PROFILE_HEADER, PROFILE_TOKEN_EXPIRE_MINUTES
+from journal import journal, JOURNAL_ENABLED
+from media_gc import media_reclaimer
+from storage import media_path, write_media, UPLOAD_BATCH_PARALLELISM
+from scheduler import scheduler, to_timestamp
+from geo import GEO_MAX_RADIUS_KM
+from revocation import revocations
+from analytics import analytics
+from timeline import timelines, TIMELINE_MAX_BUCKETS, TIMELINE_MAX_RESOLUTION
+from events import events_db, restore_state, create_event, get_event, get_events_by_admin, get_all_events, get_nearby_events, search_events, update_event, delete_event, create_voucher, get_vouchers_by_event, redeem_voucher, get_user_events
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Restore the in-memory stores and start background work on startup; flush on shutdown"""
+    if JOURNAL_ENABLED:
+        state = await run_in_threadpool(journal.recover)
+        users_db.update(state["users"])
+        restore_state(state)
+        for event_id, event_moments in state["moments"].items():
+            events.setdefault(event_id, {"id": event_id, "moments": []})["moments"] = event_moments
+            analytics.restore_moments(event_id, event_moments)
+            timelines.add_moments(event_id, event_moments)
+        media_reclaimer.restore(state)
+        revocations.restore(state)
+        journal.open()
+    scheduler.start()
+    media_reclaimer.start(live_moment_files, scan_orphans=JOURNAL_ENABLED)
+    yield
+    await media_reclaimer.stop()
+    await scheduler.stop()
+    await run_in_threadpool(journal.close)
+
+def event_exists(event_id: str) -> bool:
+    """Events created through POST /events live in events_db; legacy ones only have an entry in `events`"""
+    return event_id in events_db or event_id in events
+
+def event_moments(event_id: str) -> list:
+    """An event's moment list, kept in `events` for both kinds of event"""
+    if not event_exists(event_id):
+        raise HTTPException(status_code=404, detail="Event not found")
+    return events.setdefault(event_id, {"id": event_id, "moments": []})["moments"]
+
+def live_moment_files(event_id: str):
+    """File names of an event's live moments, or None if the event no longer exists"""
+    if not event_exists(event_id):
+        return None
+    return [moment["filename"] for moment in list(events.get(event_id, {}).get("moments", []))]
 
 app = FastAPI(
     title="SuperMoment API",
     description="API for collecting and sharing photos and videos from different angles",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+app.router.route_class = ProfiledRoute
+
+# Upload admission control and rate limiting
+app.add_middleware(AdmissionMiddleware)
 
 # CORS middleware
 app.add_middleware(
@@ -28,6 +82,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profiling of signed and sampled requests
+app.add_middleware(ProfilingMiddleware)
+
 # Security
 security = HTTPBearer()
 
@@ -106,7 +163,8 @@ async def register(user_data: UserCreate):
 @app.get("/auth/me")
 async def get_current_user_info(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current user information"""
-    user = verify_token(credentials.credentials)
+    with span("auth"):
+        user = verify_token(credentials.credentials)
     return {
         "email": user["email"],
         "full_name": user["full_name"],
@@ -116,7 +174,10 @@ async def get_current_user_info(credentials: HTTPAuthorizationCredentials = Depe
 
 @app.post("/auth/logout")
 async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Logout endpoint (client should discard token)"""
+    """Logout endpoint, revokes the token"""
+    with span("auth"):
+        verify_token(credentials.credentials)
+    await revoke_token(credentials.credentials)
     return {"message": "Successfully logged out"}
 
 @app.post("/auth/apple", response_model=LoginResponse)
@@ -179,8 +240,94 @@ async def google_sign_in(google_data: GoogleSignInRequest):
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Dependency to get current user"""
-    return verify_token(credentials.credentials)
+    with span("auth"):
+        return verify_token(credentials.credentials)
 
+async def get_current_admin(current_user: dict = Depends(get_current_user)):
+    """Dependency to get current user, requiring the admin role"""
+    if current_user["role"] != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
+
+# Profiling Endpoints
+@app.post("/admin/profiling/token")
+async def create_profiling_token(current_user: dict = Depends(get_current_admin)):
+    """Issue a signed token; requests sending it in the profile header are profiled"""
+    return {
+        "token": create_profile_token(),
+        "header": PROFILE_HEADER,
+        "expires_in": PROFILE_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+@app.get("/admin/profiling/profiles")
+async def list_profiles(current_user: dict = Depends(get_current_admin)):
+    """List the profiles kept in the ring buffer, newest first"""
+    profiles = await run_in_threadpool(profile_ring.list)
+    return {"profiles": profiles, "count": len(profiles)}
+
+@app.get("/admin/uploads/admission")
+async def get_upload_admission(current_user: dict = Depends(get_current_admin)):
+    """Get this worker's upload admission counters"""
+    return upload_gate.stats()
+
+@app.get("/admin/media/gc")
+async def get_media_gc_status(current_user: dict = Depends(get_current_admin)):
+    """Get the media reclamation queue length and counters"""
+    return media_reclaimer.status()
+
+@app.post("/admin/media/scan")
+async def scan_orphaned_media(current_user: dict = Depends(get_current_admin)):
+    """Queue removal of uploaded files that no live moment or event refers to"""
+    if not JOURNAL_ENABLED:
+        # Without the journal the stores start empty, so every upload would look orphaned
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Orphan scans need the journal to be enabled"
+        )
+    orphans = await media_reclaimer.scan_orphans(live_moment_files)
+    return {"orphans_queued": orphans}
+
+@app.get("/admin/profiling/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, current_user: dict = Depends(get_current_admin)):
+    """Get a profile's collapsed stacks, ready for flamegraph.pl or speedscope"""
+    folded = await run_in_threadpool(profile_ring.read_folded, profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(folded)
+
+
+# Declared before /events/{event_id} so "search" and "nearby" are not taken for event ids
+@app.get("/events/search", response_model=EventList)
+async def search_events_by_text(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """Search events by title, description and location"""
+    events = await search_events(q, current_user["email"], current_user["role"], limit)
+    return EventList(events=events, total=len(events))
+
+@app.get("/events/nearby", response_model=NearbyEventList)
+async def list_nearby_events(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(10, gt=0, le=GEO_MAX_RADIUS_KM),
+    status: Optional[EventStatus] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: dict = Depends(get_current_user)
+):
+    """List events within a radius of a point, nearest first"""
+    nearby = await get_nearby_events(
+        latitude, longitude, radius_km, current_user["email"],
+        status=status, date_from=date_from, date_to=date_to, limit=limit
+    )
+    events = [NearbyEvent(**event.model_dump(), distance_km=round(distance, 3)) for distance, event in nearby]
+    return NearbyEventList(events=events, total=len(events))
 
 
 @app.get("/events/{event_id}")
@@ -201,60 +348,144 @@ async def upload_media(
     current_user: dict = Depends(get_current_user)
 ):
     """Uploads media file for an event"""
-    if event_id not in events:
-        raise HTTPException(status_code=404, detail="Event not found")
+    event_moments(event_id)
+    
+    moment = await save_media(event_id, file, latitude, longitude, timestamp, current_user["email"])
+    
+    event_moments(event_id).append(moment)
+    analytics.record_upload(event_id, moment)
+    timelines.add_moments(event_id, [moment])
+    await journal.append(("moment", event_id, moment))
     
-    # Create upload directory if it doesn't exist
-    upload_dir = f"uploads/{event_id}"
-    os.makedirs(upload_dir, exist_ok=True)
+    return {
+        "message": "File successfully uploaded",
+        "moment_id": moment["id"],
+        "file_id": moment["file_id"]
+    }
+
+@app.post("/events/{event_id}/upload/batch")
+async def upload_media_batch(
+    event_id: str,
+    files: List[UploadFile] = File(...),
+    latitude: List[float] = Form(...),
+    longitude: List[float] = Form(...),
+    timestamp: List[str] = Form(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """Uploads many media files for an event; the i-th latitude/longitude/timestamp belong to the i-th file"""
+    event_moments(event_id)
+    
+    if not len(files) == len(latitude) == len(longitude) == len(timestamp):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Each file needs its own latitude, longitude and timestamp"
+        )
     
+    max_files = batch_max_files()
+    if len(files) > max_files:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {max_files} files per batch"
+        )
+    
+    # Rate limits count files, not requests
+    charge_batch_files(current_user["email"], event_id, len(files))
+    
+    # Write files concurrently, a bounded number at a time
+    semaphore = asyncio.Semaphore(UPLOAD_BATCH_PARALLELISM)
+    
+    async def save(i: int):
+        async with semaphore:
+            return await save_media(event_id, files[i], latitude[i], longitude[i], timestamp[i], current_user["email"])
+    
+    outcomes = await asyncio.gather(*(save(i) for i in range(len(files))), return_exceptions=True)
+    
+    # Register every stored moment in one step
+    moments = [outcome for outcome in outcomes if isinstance(outcome, dict)]
+    if moments:
+        event_moments(event_id).extend(moments)
+        for moment in moments:
+            analytics.record_upload(event_id, moment)
+        timelines.add_moments(event_id, moments)
+        await journal.append(*[("moment", event_id, moment) for moment in moments])
+    
+    results = []
+    for file, outcome in zip(files, outcomes):
+        if isinstance(outcome, dict):
+            results.append({"filename": file.filename, "success": True, "moment_id": outcome["id"], "file_id": outcome["file_id"]})
+        else:
+            results.append({"filename": file.filename, "success": False, "error": "Failed to store file"})
+    
+    return {
+        "message": f"{len(moments)} of {len(files)} files successfully uploaded",
+        "uploaded": len(moments),
+        "failed": len(files) - len(moments),
+        "results": results
+    }
+
+async def save_media(event_id: str, file: UploadFile, latitude: float, longitude: float, timestamp: str, user_email: str) -> dict:
+    """Stores an uploaded file and returns its (not yet registered) moment entry"""
     # Generate unique filename
     file_extension = os.path.splitext(file.filename)[1]
     file_id = str(uuid.uuid4())
     filename = f"{file_id}{file_extension}"
-    file_path = os.path.join(upload_dir, filename)
     
     # Save file
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    with span("file_io"):
+        file_size = await write_media(media_path(event_id, filename), file)
     
     # Create moment entry
-    moment = {
+    return {
         "id": str(uuid.uuid4()),
         "file_id": file_id,
         "filename": filename,
-        "user_id": current_user["email"],
+        "user_id": user_email,
         "latitude": latitude,
         "longitude": longitude,
         "timestamp": timestamp,
         "uploaded_at": datetime.now().isoformat(),
-        "file_size": len(content),
+        "file_size": file_size,
         "file_type": file.content_type
     }
-    
-    events[event_id]["moments"].append(moment)
-    
-    return {
-        "message": "File successfully uploaded",
-        "moment_id": moment["id"],
-        "file_id": file_id
-    }
 
 @app.get("/events/{event_id}/moments")
 async def get_moments(event_id: str, user_id: Optional[str] = None):
     """Gets all moments for an event"""
-    if event_id not in events:
-        raise HTTPException(status_code=404, detail="Event not found")
-    
-    moments = events[event_id]["moments"]
+    moments = event_moments(event_id)
     
     # If user_id is specified, filter only their moments
     if user_id:
-        moments = [m for m in moments if m["user_id"] == user_id]
+        with span("store"):
+            moments = [m for m in moments if m["user_id"] == user_id]
     
     return {"moments": moments, "count": len(moments)}
 
+@app.get("/events/{event_id}/timeline")
+async def get_moment_timeline(
+    event_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: float = Query(60, gt=0, le=TIMELINE_MAX_RESOLUTION, description="Bucket width in seconds"),
+    max_buckets: int = Query(1000, ge=1, le=TIMELINE_MAX_BUCKETS),
+    contributors: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Histogram of moment counts over time; the resolution is widened to fit max_buckets"""
+    if not event_exists(event_id):
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    # Naive bounds are UTC; comparing timestamps lets naive and aware values mix
+    start_at = to_timestamp(start) if start else None
+    end_at = to_timestamp(end) if end else None
+    if start_at is not None and end_at is not None and end_at <= start_at:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="end must be after start")
+    
+    with span("store"):
+        histogram = timelines.histogram(event_id, start_at, end_at, resolution, max_buckets, contributors)
+    histogram["start"] = datetime.fromtimestamp(histogram["start"], timezone.utc).isoformat()
+    histogram["end"] = datetime.fromtimestamp(histogram["end"], timezone.utc).isoformat()
+    return histogram
+
 @app.post("/vouchers/create")
 async def create_voucher(
     event_id: str = Form(...),
@@ -356,6 +587,27 @@ async def get_event_by_id(
     
     return event
 
+@app.get("/events/{event_id}/stats")
+async def get_event_stats(
+    event_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Live upload and voucher statistics of an event (event admin only)"""
+    event = events_db.get(event_id)
+    if not event:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Event not found"
+        )
+    
+    if event.admin_email != current_user["email"] and current_user["role"] != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only event admin can view event statistics"
+        )
+    
+    return analytics.event_stats(event_id)
+
 @app.put("/events/{event_id}", response_model=Event)
 async def update_event_by_id(
     event_id: str,
@@ -372,6 +624,12 @@ async def delete_event_by_id(
 ):
     """Delete an event"""
     success = await delete_event(event_id, current_user["email"])
+    
+    # Drop the event's moments now; its files are removed in the background
+    events.pop(event_id, None)
+    timelines.forget_event(event_id)
+    await journal.append(("moments", event_id, None))
+    await media_reclaimer.enqueue_event(event_id)
     return {"message": "Event deleted successfully"}
 
 # Voucher Management Endpoints
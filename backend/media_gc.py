@@ -0,0 +1,230 @@
+"""
+Media Garbage Collection
+Throttled background removal of media belonging to deleted events and of orphaned files
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+import asyncio
+import os
+import threading
+import time
+
+from journal import journal
+from storage import UPLOAD_DIR, forget_dirs, resolve_media_path
+
+# Configuration
+MEDIA_GC_FILES_PER_SECOND = float(os.getenv("MEDIA_GC_FILES_PER_SECOND", "200"))
+MEDIA_GC_SCAN_INTERVAL = float(os.getenv("MEDIA_GC_SCAN_INTERVAL", "21600"))
+MEDIA_GC_ORPHAN_GRACE = float(os.getenv("MEDIA_GC_ORPHAN_GRACE", "3600"))
+MEDIA_GC_RETRY_INTERVAL = float(os.getenv("MEDIA_GC_RETRY_INTERVAL", "300"))
+MEDIA_GC_SCAN_ORPHANS = os.getenv("MEDIA_GC_SCAN_ORPHANS", "0") == "1"
+
+# Tasks are ("event", event_id, None) for deleted events or ("moment", event_id, filename) for orphaned files
+Task = Tuple[str, str, Optional[str]]
+LiveFiles = Callable[[str], Optional[Iterable[str]]]
+
+# Outcomes of running a task on the worker thread
+DONE, FAILED, STOPPED = "done", "failed", "stopped"
+
+
+def task_key(task: Task) -> str:
+    kind, event_id, filename = task
+    return f"{kind}:{event_id}" if filename is None else f"{kind}:{event_id}/{filename}"
+
+
+class Throttle:
+    """Paces file removals to a fixed rate from a worker thread"""
+
+    def __init__(self, rate: float, stop: threading.Event):
+        self.rate = rate
+        self.stop = stop
+        self.started = time.monotonic()
+        self.count = 0
+
+    def tick(self) -> bool:
+        """Account for one removal; return False once shutdown was requested"""
+        self.count += 1
+        if self.rate:
+            ahead = self.count / self.rate - (time.monotonic() - self.started)
+            if ahead > 0:
+                self.stop.wait(ahead)
+        return not self.stop.is_set()
+
+
+class MediaReclaimer:
+    """Persisted queue of media to delete, drained by one throttled worker thread"""
+
+    def __init__(self, root: str = UPLOAD_DIR, files_per_second: float = MEDIA_GC_FILES_PER_SECOND):
+        self.root = root
+        self.files_per_second = files_per_second
+        self.queue: Dict[str, Task] = {}
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="media-gc")
+        self.stopping = threading.Event()
+        self.wakeup: Optional[asyncio.Event] = None
+        self.tasks = []
+        self.stats = {"files_removed": 0, "bytes_removed": 0, "tasks_done": 0, "orphans_found": 0, "remove_errors": 0,
+                      "task_errors": 0, "scan_errors": 0}
+
+    def restore(self, state: dict):
+        """Re-queue work that was pending when the process stopped"""
+        for key, task in state.get("gc", {}).items():
+            self.queue[key] = tuple(task)
+
+    async def enqueue(self, *tasks: Task):
+        """Persist tasks to the journal and hand them to the worker"""
+        for task in tasks:
+            self.queue[task_key(task)] = task
+        await journal.append(*[("gc", task_key(task), task) for task in tasks])
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def enqueue_event(self, event_id: str):
+        await self.enqueue(("event", event_id, None))
+
+    # Worker thread
+
+    def _remove_file(self, path: str, throttle: Throttle) -> str:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return DONE
+        except OSError:
+            # Permissions or a busy file; the task stays queued and is retried later
+            self.stats["remove_errors"] += 1
+            return FAILED
+        self.stats["files_removed"] += 1
+        self.stats["bytes_removed"] += size
+        return DONE if throttle.tick() else STOPPED
+
+    def _run_task(self, task: Task) -> str:
+        """Delete the task's files; return DONE, FAILED if some could not be removed, or STOPPED on shutdown"""
+        kind, event_id, filename = task
+        throttle = Throttle(self.files_per_second, self.stopping)
+        if kind == "moment":
+            path = resolve_media_path(event_id, filename, self.root)
+            return DONE if path is None else self._remove_file(path, throttle)
+
+        event_dir = os.path.join(self.root, event_id)
+        outcome = DONE
+        for directory, subdirs, files in os.walk(event_dir, topdown=False):
+            for name in files:
+                removed = self._remove_file(os.path.join(directory, name), throttle)
+                if removed == STOPPED:
+                    return STOPPED
+                if removed == FAILED:
+                    outcome = FAILED
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+        forget_dirs(event_dir)
+        return outcome
+
+    def _scan(self, live_files: LiveFiles, now: float, since: float) -> list:
+        """Find files written since the journal was started that no live moment refers to
+
+        Files older than `since` predate the journal, so their absence from the stores proves
+        nothing and they are always kept. A directory of an unknown event is removed whole only
+        when every file in it is reclaimable.
+        """
+        orphans = []
+        if not os.path.isdir(self.root):
+            return orphans
+        with os.scandir(self.root) as entries:
+            event_dirs = [entry for entry in entries if entry.is_dir(follow_symlinks=False)]
+        for entry in event_dirs:
+            if self.stopping.is_set():
+                break
+            event_id = entry.name
+            live = live_files(event_id)
+            known = live is not None
+            live = set(live or ())
+            found, kept = [], 0
+            for directory, _, files in os.walk(entry.path):
+                for name in files:
+                    modified = os.path.getmtime(os.path.join(directory, name))
+                    # Files of uploads still in flight have no moment yet
+                    if name in live or modified < since or now - modified <= MEDIA_GC_ORPHAN_GRACE:
+                        kept += 1
+                    else:
+                        found.append(("moment", event_id, name))
+            if not known and found and not kept:
+                orphans.append(("event", event_id, None))
+            else:
+                orphans.extend(found)
+        return orphans
+
+    # Event loop side
+
+    async def scan_orphans(self, live_files: LiveFiles) -> int:
+        """Reconcile the uploads tree against live moments and queue whatever is orphaned"""
+        if journal.created_at is None:
+            return 0  # without a recovered journal every file would look orphaned
+        loop = asyncio.get_running_loop()
+        orphans = await loop.run_in_executor(self.executor, self._scan, live_files, time.time(), journal.created_at)
+        orphans = [task for task in orphans if task_key(task) not in self.queue]
+        if orphans:
+            self.stats["orphans_found"] += len(orphans)
+            await self.enqueue(*orphans)
+        return len(orphans)
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self.wakeup.clear()
+            for key, task in list(self.queue.items()):
+                if key not in self.queue:
+                    continue
+                try:
+                    outcome = await loop.run_in_executor(self.executor, self._run_task, task)
+                    if outcome == STOPPED:
+                        return
+                    if outcome == DONE:
+                        await journal.append(("gc", key, None))
+                        self.queue.pop(key, None)
+                        self.stats["tasks_done"] += 1
+                except Exception:
+                    # The task stays queued and is retried with the failed ones
+                    self.stats["task_errors"] += 1
+            # Whatever is left failed this round; retry it later unless new work arrives first
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), MEDIA_GC_RETRY_INTERVAL if self.queue else None)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _scan_periodically(self, live_files: LiveFiles):
+        while True:
+            await asyncio.sleep(MEDIA_GC_SCAN_INTERVAL)
+            try:
+                await self.scan_orphans(live_files)
+            except Exception:
+                self.stats["scan_errors"] += 1
+
+    def start(self, live_files: LiveFiles, scan_orphans: bool = True):
+        """Start draining the queue; `live_files(event_id)` lists an event's live files or None if it is gone
+
+        Periodic orphan scans are opt-in (MEDIA_GC_SCAN_ORPHANS) and need stores recovered from
+        the journal; files written before the journal was started are never reclaimed.
+        """
+        loop = asyncio.get_running_loop()
+        self.stopping.clear()
+        self.wakeup = asyncio.Event()
+        self.tasks = [loop.create_task(self._drain())]
+        if MEDIA_GC_SCAN_INTERVAL and MEDIA_GC_SCAN_ORPHANS and scan_orphans:
+            self.tasks.append(loop.create_task(self._scan_periodically(live_files)))
+
+    async def stop(self):
+        self.stopping.set()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.wakeup = None
+
+    def status(self) -> dict:
+        return {"queued": len(self.queue), **self.stats}
+
+
+media_reclaimer = MediaReclaimer()
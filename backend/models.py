@@ -94,6 +94,13 @@ class EventList(BaseModel):
     events: List[Event]
     total: int
 
+class NearbyEvent(Event):
+    distance_km: float
+
+class NearbyEventList(BaseModel):
+    events: List[NearbyEvent]
+    total: int
+
 # Voucher Management Models
 class VoucherStatus(str, Enum):
     ACTIVE = "active"
@@ -0,0 +1,346 @@
+"""
+Request Profiling
+On-demand and sampled request profiles written to a bounded on-disk ring buffer
+
+Phase timings are per request, but stacks are sampled from the whole event-loop thread:
+under concurrency a profile's flamegraph shows everything the loop ran while the request
+was in flight, including unprofiled requests and idle time in select. Read it as a
+per-loop profile of that window. Only one request per loop is profiled at a time; a
+request arriving while another is profiled runs unprofiled and its response carries no
+x-profile-id header.
+"""
+
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+import asyncio
+import functools
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+from fastapi.routing import APIRoute
+
+from auth import SECRET_KEY
+
+# Configuration
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", "200"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1.0"))
+PROFILE_TOKEN_EXPIRE_MINUTES = 15
+PROFILE_HEADER = "x-profile-token"
+
+# Handler phases reported in every profile
+PHASES = ("auth", "store", "serialization", "file_io")
+
+
+@dataclass
+class Profile:
+    """Measurements collected while one request is in flight"""
+    id: str
+    method: str
+    path: str
+    trigger: str
+    thread_id: int
+    started_at: float = field(default_factory=time.time)
+    phases: Dict[str, float] = field(default_factory=lambda: {phase: 0.0 for phase in PHASES})
+    stacks: Dict[str, int] = field(default_factory=dict)
+    open_phases: Set[str] = field(default_factory=set)
+    endpoint_finished: Optional[float] = None
+    duration: float = 0.0
+    status_code: Optional[int] = None
+
+    def record(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def metadata(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "trigger": self.trigger,
+            "status_code": self.status_code,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "phases_ms": {phase: round(seconds * 1000, 3) for phase, seconds in self.phases.items()},
+            "samples": sum(self.stacks.values()),
+        }
+
+    def folded(self) -> str:
+        """Collapsed stacks, one `frame;frame;frame count` line per stack (flamegraph.pl, speedscope, inferno)"""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+current_profile: ContextVar[Optional[Profile]] = ContextVar("current_profile", default=None)
+
+
+class span:
+    """Attribute the enclosed block to a handler phase of the current profile
+
+    Spans nested in an open span of the same phase are not recorded, so their time is counted once.
+    """
+
+    def __init__(self, phase: str):
+        self.phase = phase
+
+    def __enter__(self):
+        self.profile = current_profile.get()
+        if self.profile is not None:
+            if self.phase in self.profile.open_phases:
+                self.profile = None
+            else:
+                self.profile.open_phases.add(self.phase)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profile is not None:
+            self.profile.open_phases.discard(self.phase)
+            self.profile.record(self.phase, time.perf_counter() - self.started)
+        return False
+
+
+def traced(phase: str):
+    """Decorator form of `span` for sync and async functions"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if current_profile.get() is None:
+                    return await func(*args, **kwargs)
+                with span(phase):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_profile.get() is None:
+                return func(*args, **kwargs)
+            with span(phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class StackSampler:
+    """Background thread sampling the event loop's stack while profiled requests are in flight
+
+    Samples are whatever the loop thread is running, not only the profiled request's frames.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.active: List[Profile] = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def register(self, profile: Profile) -> bool:
+        """Start sampling for `profile`; False if another profile is already running on its thread"""
+        with self.lock:
+            if any(p.thread_id == profile.thread_id for p in self.active):
+                return False
+            self.active.append(profile)
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+            self.thread.start()
+        self.wakeup.set()
+        return True
+
+    def unregister(self, profile: Profile):
+        with self.lock:
+            self.active.remove(profile)
+
+    def _run(self):
+        while True:
+            with self.lock:
+                if not self.active:
+                    self.wakeup.clear()
+                else:
+                    self._sample()
+            if not self.wakeup.is_set():
+                self.wakeup.wait()
+                continue
+            time.sleep(self.interval)
+
+    def _sample(self):
+        frames = sys._current_frames()
+        for profile in self.active:
+            frame = frames.get(profile.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if not stack:
+                continue
+            folded = ";".join(reversed(stack))
+            profile.stacks[folded] = profile.stacks.get(folded, 0) + 1
+
+
+sampler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+
+
+class ProfileRing:
+    """Fixed number of profile slots on disk; the oldest slot is overwritten first"""
+
+    def __init__(self, directory: str, size: int):
+        self.directory = directory
+        self.size = size
+        self.lock = threading.Lock()
+        self.next_slot: Optional[int] = None
+
+    def _slot_path(self, slot: int, suffix: str) -> str:
+        return os.path.join(self.directory, f"slot-{slot:04d}.{suffix}")
+
+    def _find_next_slot(self) -> int:
+        newest, newest_mtime = -1, -1.0
+        for slot in range(self.size):
+            path = self._slot_path(slot, "json")
+            if os.path.exists(path) and os.path.getmtime(path) > newest_mtime:
+                newest, newest_mtime = slot, os.path.getmtime(path)
+        return (newest + 1) % self.size
+
+    def write(self, profile: Profile):
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            if self.next_slot is None:
+                self.next_slot = self._find_next_slot()
+            slot = self.next_slot
+            self.next_slot = (slot + 1) % self.size
+            with open(self._slot_path(slot, "folded"), "w") as f:
+                f.write(profile.folded())
+            with open(self._slot_path(slot, "json"), "w") as f:
+                json.dump(profile.metadata(), f)
+
+    def list(self) -> List[dict]:
+        profiles = []
+        for slot in range(self.size):
+            path = self._slot_path(slot, "json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    profiles.append(json.load(f))
+        return sorted(profiles, key=lambda p: p["started_at"], reverse=True)
+
+    def read_folded(self, profile_id: str) -> Optional[str]:
+        for slot in range(self.size):
+            path = self._slot_path(slot, "json")
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                if json.load(f)["id"] != profile_id:
+                    continue
+            with open(self._slot_path(slot, "folded")) as f:
+                return f.read()
+        return None
+
+
+ring = ProfileRing(PROFILE_DIR, PROFILE_RING_SIZE)
+
+
+def create_profile_token(expires_minutes: int = PROFILE_TOKEN_EXPIRE_MINUTES) -> str:
+    """Create a signed token that enables profiling for requests carrying it"""
+    expires = int(time.time()) + expires_minutes * 60
+    signature = hmac.new(SECRET_KEY.encode(), f"profile:{expires}".encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify_profile_token(token: str) -> bool:
+    """Check the signature and expiry of a profiling token"""
+    expires, _, signature = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(SECRET_KEY.encode(), f"profile:{expires}".encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, expected)
+
+
+def _mark_endpoint_finished(endpoint):
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            profile = current_profile.get()
+            if profile is not None:
+                profile.endpoint_finished = time.perf_counter()
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """Route that attributes response validation and serialization to the current profile"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            endpoint = _mark_endpoint_finished(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request):
+            response = await handler(request)
+            profile = current_profile.get()
+            if profile is not None and profile.endpoint_finished is not None:
+                profile.record("serialization", time.perf_counter() - profile.endpoint_finished)
+            return response
+        return profiled_handler
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles signed requests and a sampled fraction of traffic"""
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    def _trigger(self, scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER.encode():
+                return "header" if verify_profile_token(value.decode("latin-1")) else None
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trigger = self._trigger(scope)
+        if trigger is None:
+            return await self.app(scope, receive, send)
+
+        profile = Profile(
+            id=str(uuid.uuid4()),
+            method=scope["method"],
+            path=scope["path"],
+            trigger=trigger,
+            thread_id=threading.get_ident()
+        )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                message.setdefault("headers", []).append((b"x-profile-id", profile.id.encode()))
+            await send(message)
+
+        if not sampler.register(profile):
+            return await self.app(scope, receive, send)
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.duration = time.perf_counter() - started
+            sampler.unregister(profile)
+            current_profile.reset(token)
+            asyncio.get_running_loop().run_in_executor(None, ring.write, profile)
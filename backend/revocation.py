@@ -0,0 +1,71 @@
+"""
+Token Revocation
+Revoked token ids (jti) bucketed by expiry, so whole buckets expire together
+"""
+
+from typing import Dict, Optional
+import os
+import time
+
+from journal import journal
+
+# Configuration
+REVOCATION_BUCKET_SECONDS = int(os.getenv("REVOCATION_BUCKET_SECONDS", "300"))
+
+
+class RevocationList:
+    """Revoked token ids that forget themselves once the tokens would have expired anyway
+
+    A token's exp picks its bucket, so a check is one dict lookup on that bucket; a
+    Bloom filter in front of it would cost more than the lookup it guards. Whole
+    buckets are dropped when their window has passed.
+    """
+
+    def __init__(self, bucket_seconds: int = REVOCATION_BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        self.buckets: Dict[int, Dict[str, int]] = {}  # exp // bucket_seconds -> {jti: token exp}
+        self.next_purge = 0.0
+        self.stats = {"checks": 0, "revoked_hits": 0}
+
+    def _purge(self, now: float):
+        if now < self.next_purge:
+            return
+        current = int(now) // self.bucket_seconds
+        # Expired entries need no tombstones: restore() skips them and compaction drops them
+        for index in [index for index in self.buckets if index < current]:
+            del self.buckets[index]
+        self.next_purge = (current + 1) * self.bucket_seconds
+
+    def add(self, jti: str, exp: int, now: Optional[float] = None):
+        """Record a revocation in memory only"""
+        now = time.time() if now is None else now
+        self._purge(now)
+        if exp <= now:
+            return
+        self.buckets.setdefault(exp // self.bucket_seconds, {})[jti] = exp
+
+    async def revoke(self, jti: str, exp: int):
+        """Revoke a token id until its expiry and persist the revocation"""
+        self.add(jti, exp)
+        await journal.append(("revoked", jti, exp))
+
+    def is_revoked(self, jti: str, exp: int) -> bool:
+        self.stats["checks"] += 1
+        self._purge(time.time())
+        bucket = self.buckets.get(exp // self.bucket_seconds)
+        if bucket is None or jti not in bucket:
+            return False
+        self.stats["revoked_hits"] += 1
+        return True
+
+    def restore(self, state: dict):
+        """Load unexpired revocations recovered from the journal"""
+        now = time.time()
+        for jti, exp in state.get("revoked", {}).items():
+            self.add(jti, exp, now)
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+
+revocations = RevocationList()
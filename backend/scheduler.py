@@ -0,0 +1,116 @@
+"""
+Timer Scheduler
+Min-heap of keyed deadlines with O(log n) scheduling and O(1) cancellation
+"""
+
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import itertools
+import time
+
+Handler = Callable[[str], Awaitable[None]]
+
+
+def to_timestamp(value: datetime) -> float:
+    """Epoch seconds for a datetime; naive values are treated as UTC like datetime.utcnow()"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class Scheduler:
+    """Fires registered handlers when their keyed deadlines pass
+
+    Entries are [when, seq, kind, key, live]. Cancelling only clears the live flag;
+    dead entries are dropped when they reach the top of the heap or when they
+    outnumber the live ones and the heap is rebuilt.
+    """
+
+    def __init__(self):
+        self.heap: List[list] = []
+        self.entries: Dict[Tuple[str, str], list] = {}
+        self.handlers: Dict[str, Handler] = {}
+        self.counter = itertools.count()
+        self.dead = 0
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def register(self, kind: str, handler: Handler):
+        """Register the coroutine called with the key when a deadline of this kind passes"""
+        self.handlers[kind] = handler
+
+    def schedule(self, kind: str, key: str, when: datetime):
+        """Schedule (or move) the deadline for `key`"""
+        self.cancel(kind, key)
+        entry = [to_timestamp(when), next(self.counter), kind, key, True]
+        self.entries[(kind, key)] = entry
+        heapq.heappush(self.heap, entry)
+        if self.heap[0] is entry and self.wakeup is not None:
+            self.wakeup.set()
+
+    def cancel(self, kind: str, key: str):
+        """Drop the pending deadline for `key`, if any"""
+        entry = self.entries.pop((kind, key), None)
+        if entry is None:
+            return
+        entry[4] = False
+        self.dead += 1
+        if self.dead > len(self.entries) and self.dead > 1024:
+            self.heap = [e for e in self.heap if e[4]]
+            heapq.heapify(self.heap)
+            self.dead = 0
+
+    def pending(self) -> int:
+        return len(self.entries)
+
+    def pop_due(self, now: float) -> List[Tuple[str, str]]:
+        """Remove and return every live entry whose deadline has passed"""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            when, seq, kind, key, live = heapq.heappop(self.heap)
+            if not live:
+                self.dead -= 1
+                continue
+            del self.entries[(kind, key)]
+            due.append((kind, key))
+        return due
+
+    def _next_timeout(self) -> Optional[float]:
+        while self.heap and not self.heap[0][4]:
+            heapq.heappop(self.heap)
+            self.dead -= 1
+        if not self.heap:
+            return None
+        return max(0.0, self.heap[0][0] - time.time())
+
+    async def run(self):
+        """Fire due deadlines until cancelled"""
+        self.wakeup = asyncio.Event()
+        while True:
+            due = self.pop_due(time.time())
+            if due:
+                await asyncio.gather(*(self.handlers[kind](key) for kind, key in due), return_exceptions=True)
+                continue
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self._next_timeout())
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self.wakeup = None
+
+
+scheduler = Scheduler()
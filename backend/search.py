@@ -0,0 +1,123 @@
+"""
+Event Search
+In-memory inverted index over event titles, descriptions and locations
+"""
+
+from bisect import bisect_left, insort
+from typing import Callable, Dict, List, Optional, Tuple
+import heapq
+import math
+import os
+import re
+import unicodedata
+
+# Configuration
+SEARCH_MAX_PREFIX_TERMS = int(os.getenv("SEARCH_MAX_PREFIX_TERMS", "200"))
+FIELD_WEIGHTS = {"title": 3.0, "location": 2.0, "description": 1.0}
+PREFIX_MATCH_WEIGHT = 0.5
+
+WORD = re.compile(r"\w+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercased words with diacritics stripped, so "Čačak" matches "cacak"."""
+    if not text:
+        return []
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    return WORD.findall(folded)
+
+
+class SearchIndex:
+    """Inverted index of term -> {key: weight}, with a sorted vocabulary for prefix lookups"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.terms: List[str] = []  # sorted vocabulary
+        self.doc_terms: Dict[str, Tuple[str, ...]] = {}
+
+    def add(self, key: str, fields: Dict[str, Optional[str]]):
+        """Index a document's fields, replacing whatever was indexed for `key` before"""
+        self.remove(key)
+        weights: Dict[str, float] = {}
+        for field, text in fields.items():
+            for term in tokenize(text):
+                weights[term] = weights.get(term, 0.0) + FIELD_WEIGHTS.get(field, 1.0)
+        for term, weight in weights.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                insort(self.terms, term)
+            # Dampen repeated words so a long description cannot outweigh the title
+            posting[key] = 1.0 + math.log(weight)
+        self.doc_terms[key] = tuple(weights)
+
+    def remove(self, key: str):
+        for term in self.doc_terms.pop(key, ()):
+            posting = self.postings[term]
+            del posting[key]
+            if not posting:
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+
+    def _expand(self, prefix: str) -> List[str]:
+        """Vocabulary terms starting with `prefix`, other than the prefix itself"""
+        start = bisect_left(self.terms, prefix)
+        expanded = []
+        for term in self.terms[start:start + SEARCH_MAX_PREFIX_TERMS + 1]:
+            if not term.startswith(prefix):
+                break
+            if term != prefix:
+                expanded.append(term)
+        return expanded
+
+    def _matches(self, word: str) -> List[Tuple[Dict[str, float], float]]:
+        """Postings matching `word` exactly or as a prefix, each with its rarity-weighted factor"""
+        total = len(self.doc_terms)
+        terms = [(word, 1.0)] if word in self.postings else []
+        terms += [(term, PREFIX_MATCH_WEIGHT) for term in self._expand(word)]
+        return [(self.postings[term], factor * math.log(1 + total / len(self.postings[term])))
+                for term, factor in terms]
+
+    def search(self, query: str, limit: Optional[int] = None,
+               accept: Optional[Callable[[str], bool]] = None) -> List[Tuple[float, str]]:
+        """(score, key) pairs of documents matching every query word, best first
+
+        Only keys passing `accept` are ranked, and only the best `limit` are returned.
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words:
+            return []
+        # The rarest word enumerates candidates, the others are only probed for them
+        per_word = sorted((self._matches(word) for word in words),
+                          key=lambda postings: sum(len(posting) for posting, _ in postings))
+        if not per_word[0]:
+            return []
+        (posting, factor), *expanded = per_word[0]
+        totals = {key: weight * factor for key, weight in posting.items()}
+        for posting, factor in expanded:
+            for key, weight in posting.items():
+                if weight * factor > totals.get(key, 0.0):
+                    totals[key] = weight * factor
+        for postings in per_word[1:]:
+            if len(postings) == 1:
+                posting, factor = postings[0]
+                totals = {key: total + posting[key] * factor for key, total in totals.items() if key in posting}
+            else:
+                narrowed = {}
+                for key, total in totals.items():
+                    best = max((posting[key] * factor for posting, factor in postings if key in posting), default=0.0)
+                    if best:
+                        narrowed[key] = total + best
+                totals = narrowed
+            if not totals:
+                return []
+        ranked = ((-score, key) for key, score in totals.items() if accept is None or accept(key))
+        best = heapq.nsmallest(limit, ranked) if limit is not None else sorted(ranked)
+        return [(-score, key) for score, key in best]
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+
+search_index = SearchIndex()
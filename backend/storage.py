@@ -0,0 +1,138 @@
+"""
+Media Storage Layout
+Uploads live in hash-prefixed shard directories: uploads/{event_id}/{ab}/{filename}
+Usage (from backend/): python -m storage migrate [uploads_dir]
+"""
+
+from typing import Dict, Optional, Set
+import asyncio
+import hashlib
+import os
+import sys
+
+import aiofiles
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+# Configuration
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_SHARD_DEPTH = int(os.getenv("UPLOAD_SHARD_DEPTH", "1"))
+UPLOAD_SHARD_WIDTH = 2  # hex characters per shard level, 256 directories per level
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_BATCH_MAX_FILES = int(os.getenv("UPLOAD_BATCH_MAX_FILES", "50"))
+UPLOAD_BATCH_PARALLELISM = int(os.getenv("UPLOAD_BATCH_PARALLELISM", "8"))
+
+# Directories known to exist, so each one is created at most once per process
+_known_dirs: Set[str] = set()
+_creating: Dict[str, asyncio.Future] = {}
+
+
+def shard_for(filename: str, depth: int = UPLOAD_SHARD_DEPTH) -> str:
+    """Relative shard directory for a file name"""
+    digest = hashlib.md5(filename.encode()).hexdigest()
+    return os.path.join(*[digest[i * UPLOAD_SHARD_WIDTH:(i + 1) * UPLOAD_SHARD_WIDTH] for i in range(depth)])
+
+
+def media_path(event_id: str, filename: str, root: str = UPLOAD_DIR) -> str:
+    """Where a media file of an event is stored"""
+    return os.path.join(root, event_id, shard_for(filename), filename)
+
+
+def resolve_media_path(event_id: str, filename: str, root: str = UPLOAD_DIR) -> Optional[str]:
+    """Find a stored media file, falling back to the pre-sharding flat layout"""
+    for path in (media_path(event_id, filename, root), os.path.join(root, event_id, filename)):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+async def ensure_dir(path: str):
+    """Create a directory off the event loop, once per process"""
+    if path in _known_dirs:
+        return
+    pending = _creating.get(path)
+    if pending is not None:
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise
+            # The creator was cancelled; take over
+            return await ensure_dir(path)
+    future = asyncio.get_running_loop().create_future()
+    _creating[path] = future
+    try:
+        await run_in_threadpool(os.makedirs, path, exist_ok=True)
+    except OSError as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved when nobody else is waiting
+        raise
+    except BaseException:
+        # Cancelled: waiters must not be left on a future nobody resolves
+        future.cancel()
+        raise
+    else:
+        _known_dirs.add(path)
+        future.set_result(None)
+    finally:
+        del _creating[path]
+
+
+async def write_media(path: str, file: UploadFile) -> int:
+    """Stream an uploaded file to `path` in chunks; return its size"""
+    await ensure_dir(os.path.dirname(path))
+    size = 0
+    async with aiofiles.open(path, "wb") as f:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await f.write(chunk)
+            size += len(chunk)
+    return size
+
+
+def forget_dirs(prefix: str):
+    """Forget cached directories under `prefix`, after they have been removed from disk"""
+    # Called from the media GC thread while ensure_dir adds on the event loop; copy() is atomic
+    for path in [p for p in _known_dirs.copy() if p == prefix or p.startswith(prefix + os.sep)]:
+        _known_dirs.discard(path)
+
+
+def migrate_event_dir(event_dir: str) -> int:
+    """Move the flat files of one event directory into shard directories"""
+    moved = 0
+    created = set()
+    with os.scandir(event_dir) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            shard_dir = os.path.join(event_dir, shard_for(entry.name))
+            if shard_dir not in created:
+                os.makedirs(shard_dir, exist_ok=True)
+                created.add(shard_dir)
+            os.rename(entry.path, os.path.join(shard_dir, entry.name))
+            moved += 1
+    return moved
+
+
+def migrate(root: str = UPLOAD_DIR) -> int:
+    """Migrate every event directory under `root` to the sharded layout"""
+    total = 0
+    if not os.path.isdir(root):
+        return total
+    with os.scandir(root) as events:
+        for entry in events:
+            if entry.is_dir(follow_symlinks=False):
+                moved = migrate_event_dir(entry.path)
+                total += moved
+                if moved:
+                    print(f"{entry.name}: moved {moved} files")
+    return total
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python -m storage migrate [uploads_dir]")
+        sys.exit(2)
+    print(f"Migrated {migrate(sys.argv[2] if len(sys.argv) > 2 else UPLOAD_DIR)} files")
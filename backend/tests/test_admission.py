@@ -0,0 +1,65 @@
+import asyncio
+import uuid
+from datetime import timedelta
+
+import httpx
+
+import auth
+from admission import AdmissionMiddleware, TokenBucketLimiter, UploadGate, UPLOAD_RETRY_AFTER
+
+
+def test_bucket_refills_at_its_rate():
+    limiter = TokenBucketLimiter(rate=2, burst=3)
+    assert [limiter.acquire("guest", now=0) for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("guest", now=0) == 0.5
+    assert limiter.acquire("guest", now=0.5) == 0
+    # Refill is capped at the burst however long the key was idle
+    assert limiter.acquire("guest", cost=3, now=100) == 0
+    assert limiter.acquire("guest", cost=4, now=200) == float("inf")
+
+
+def test_wait_does_not_take_tokens():
+    limiter = TokenBucketLimiter(rate=1, burst=2)
+    assert limiter.wait("guest", 2, now=0) == 0
+    assert limiter.acquire("guest", 2, now=0) == 0
+
+
+def test_idle_and_excess_keys_are_evicted():
+    limiter = TokenBucketLimiter(rate=1, burst=1, max_keys=2, idle_seconds=10)
+    limiter.acquire("a", now=0)
+    limiter.acquire("b", now=5)
+    limiter.acquire("c", now=11)
+    assert list(limiter.buckets) == ["b", "c"]  # "a" went idle
+    limiter.acquire("d", now=12)
+    assert list(limiter.buckets) == ["c", "d"]  # "b" was the least recently used over max_keys
+
+
+def test_busy_gate_sheds_uploads_with_retry_after():
+    release = asyncio.Event()
+    started = asyncio.Event()
+
+    async def app(scope, receive, send):
+        started.set()
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    gate = UploadGate(max_concurrent=1)
+    transport = httpx.ASGITransport(app=AdmissionMiddleware(app, gate))
+    token = auth.create_access_token({"sub": f"{uuid.uuid4().hex}@x.com"}, timedelta(minutes=5))
+    headers = {"Authorization": f"Bearer {token}"}
+    path = f"/events/{uuid.uuid4().hex}/upload"
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = asyncio.create_task(client.post(path, headers=headers, content=b"x"))
+            await started.wait()
+            shed = await client.post(path, headers=headers, content=b"x")
+            release.set()
+            return await first, shed
+    first, shed = asyncio.run(run())
+
+    assert first.status_code == 200
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == str(max(1, UPLOAD_RETRY_AFTER))
+    assert gate.rejected == 1 and gate.active == 0
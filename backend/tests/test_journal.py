@@ -0,0 +1,122 @@
+import asyncio
+import os
+import time
+
+from journal import FRAME, Journal, SNAPSHOT_MAGIC, compact_directory, list_segments, list_snapshots
+
+
+def open_journal(directory) -> Journal:
+    target = Journal(str(directory), fsync=False, commit_interval=0, snapshot_interval=3600)
+    target.recover()
+    target.open()
+    return target
+
+
+def write(target: Journal, *records):
+    asyncio.run(target.append(*records))
+
+
+def recover(directory):
+    return Journal(str(directory)).recover()
+
+
+def test_replays_every_kind_of_record(tmp_path):
+    target = open_journal(tmp_path)
+    write(target, ("event", "e1", {"title": "Wedding"}), ("participants", "e1", ["admin@x.com"]))
+    write(target, ("participant", "e1", "guest@x.com"), ("moment", "e1", {"id": "m1"}))
+    write(target, ("event", "e2", {"title": "Gone"}), ("event", "e2", None))
+    target.append_nowait(("revoked", "jti-1", 123))
+    target.close()
+
+    state = recover(tmp_path)
+    assert state["events"] == {"e1": {"title": "Wedding"}}
+    assert state["participants"] == {"e1": ["admin@x.com", "guest@x.com"]}
+    assert state["moments"] == {"e1": [{"id": "m1"}]}
+    assert state["revoked"] == {"jti-1": 123}
+
+
+def test_empty_append_returns_immediately(tmp_path):
+    target = open_journal(tmp_path)
+    asyncio.run(asyncio.wait_for(target.append(), timeout=1))
+    target.close()
+
+
+def test_torn_tail_is_dropped_and_truncated(tmp_path):
+    target = open_journal(tmp_path)
+    write(target, ("event", "e1", {"title": "Kept"}))
+    target.close()
+    segment = list_segments(str(tmp_path))[-1]
+    valid_length = os.path.getsize(segment)
+    with open(segment, "ab") as f:
+        # A crash mid-write leaves a frame header promising more bytes than were written
+        f.write(FRAME.pack(100, 0) + b"partial")
+
+    state = recover(tmp_path)
+    assert state["events"] == {"e1": {"title": "Kept"}}
+    assert os.path.getsize(segment) == valid_length
+
+    # The journal keeps working after the tail was cut off
+    target = open_journal(tmp_path)
+    write(target, ("event", "e2", {"title": "After crash"}))
+    target.close()
+    assert set(recover(tmp_path)["events"]) == {"e1", "e2"}
+
+
+def test_snapshot_then_tail_replay(tmp_path):
+    target = open_journal(tmp_path)
+    write(target, *[("moment", "e1", {"id": f"m{i}"}) for i in range(100)])
+    target.snapshot()
+    assert target.stats["snapshots"] == 1
+    assert target.stats["compaction_errors"] == 0
+    write(target, ("moment", "e1", {"id": "tail"}), ("moments", "e2", None))
+    target.close()
+
+    snapshots = list_snapshots(str(tmp_path))
+    assert len(snapshots) == 1
+    # Segments folded into the snapshot are gone
+    assert all(path > snapshots[0].replace("snapshot-", "journal-") for path in list_segments(str(tmp_path)))
+
+    moments = recover(tmp_path)["moments"]["e1"]
+    assert [moment["id"] for moment in moments] == [f"m{i}" for i in range(100)] + ["tail"]
+
+
+def test_corrupt_snapshot_falls_back_to_older_one(tmp_path):
+    target = open_journal(tmp_path)
+    write(target, ("event", "e1", {"title": "In snapshot"}))
+    target.snapshot()
+    write(target, ("event", "e2", {"title": "In tail"}))
+    target.close()
+
+    # A newer snapshot whose payload does not match its checksum is skipped
+    newest = os.path.join(str(tmp_path), f"snapshot-{10 ** 9:016d}.bin")
+    with open(newest, "wb") as f:
+        f.write(SNAPSHOT_MAGIC + FRAME.pack(4, 0) + b"junk")
+    assert set(recover(tmp_path)["events"]) == {"e1", "e2"}
+
+
+def test_compaction_is_idempotent(tmp_path):
+    target = open_journal(tmp_path)
+    write(target, ("event", "e1", {"title": "Once"}))
+    target.close()
+    sealed = int(os.path.basename(list_segments(str(tmp_path))[-1]).split("-")[1].split(".")[0])
+
+    assert compact_directory(str(tmp_path), sealed)
+    assert not compact_directory(str(tmp_path), sealed)
+    assert recover(tmp_path)["events"] == {"e1": {"title": "Once"}}
+
+
+def test_compaction_drops_expired_revocations(tmp_path):
+    target = open_journal(tmp_path)
+    write(target, ("revoked", "expired", int(time.time()) - 1), ("revoked", "live", int(time.time()) + 3600))
+    target.snapshot()
+    target.close()
+    assert set(recover(tmp_path)["revoked"]) == {"live"}
+
+
+def test_created_marker_survives_recovery(tmp_path):
+    started = Journal(str(tmp_path))
+    started.recover()
+    time.sleep(0.01)
+    again = Journal(str(tmp_path))
+    again.recover()
+    assert again.created_at == started.created_at <= time.time()
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import time
+
+import media_gc
+from media_gc import DONE, FAILED, MEDIA_GC_ORPHAN_GRACE, MediaReclaimer
+from storage import media_path
+
+NOW = time.time()
+JOURNAL_STARTED = NOW - 10 * MEDIA_GC_ORPHAN_GRACE
+
+
+def upload(root, event_id: str, filename: str, modified: float) -> str:
+    path = media_path(event_id, filename, str(root))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"media")
+    os.utime(path, (modified, modified))
+    return path
+
+
+def scan(root, live: dict) -> list:
+    return sorted(MediaReclaimer(str(root))._scan(live.get, NOW, JOURNAL_STARTED))
+
+
+def test_files_older_than_the_journal_are_kept(tmp_path):
+    # Uploads from before the journal existed, e.g. the first deploy or a lost data/ directory
+    upload(tmp_path, "legacy-event", "old.jpg", JOURNAL_STARTED - 60)
+    upload(tmp_path, "known-event", "old.jpg", JOURNAL_STARTED - 60)
+
+    assert scan(tmp_path, {"known-event": []}) == []
+
+
+def test_unknown_event_is_reclaimed_whole_only_when_every_file_is_orphaned(tmp_path):
+    upload(tmp_path, "deleted-event", "a.jpg", NOW - 2 * MEDIA_GC_ORPHAN_GRACE)
+    upload(tmp_path, "mixed-event", "new.jpg", NOW - 2 * MEDIA_GC_ORPHAN_GRACE)
+    upload(tmp_path, "mixed-event", "old.jpg", JOURNAL_STARTED - 60)
+
+    assert scan(tmp_path, {}) == [("event", "deleted-event", None), ("moment", "mixed-event", "new.jpg")]
+
+
+def test_known_event_keeps_live_and_recent_files(tmp_path):
+    upload(tmp_path, "e1", "live.jpg", NOW - 2 * MEDIA_GC_ORPHAN_GRACE)
+    upload(tmp_path, "e1", "orphan.jpg", NOW - 2 * MEDIA_GC_ORPHAN_GRACE)
+    upload(tmp_path, "e1", "in-flight.jpg", NOW - 60)
+
+    assert scan(tmp_path, {"e1": ["live.jpg"]}) == [("moment", "e1", "orphan.jpg")]
+
+
+def test_scan_without_a_journal_queues_nothing(tmp_path, monkeypatch):
+    upload(tmp_path, "e1", "a.jpg", NOW - 2 * MEDIA_GC_ORPHAN_GRACE)
+    monkeypatch.setattr(media_gc.journal, "created_at", None)
+    reclaimer = MediaReclaimer(str(tmp_path))
+
+    assert asyncio.run(reclaimer.scan_orphans(lambda event_id: None)) == 0
+    assert reclaimer.queue == {}
+
+
+def test_event_task_removes_the_event_directory(tmp_path):
+    upload(tmp_path, "e1", "a.jpg", NOW)
+    upload(tmp_path, "e1", "b.jpg", NOW)
+    reclaimer = MediaReclaimer(str(tmp_path), files_per_second=0)
+
+    assert reclaimer._run_task(("event", "e1", None)) == DONE
+    assert not os.path.exists(tmp_path / "e1")
+    assert reclaimer.stats["files_removed"] == 2
+
+
+def test_failed_removal_is_counted_and_reported(tmp_path, monkeypatch):
+    path = upload(tmp_path, "e1", "a.jpg", NOW)
+
+    def busy(path):
+        raise PermissionError(path)
+    monkeypatch.setattr(media_gc.os, "remove", busy)
+    reclaimer = MediaReclaimer(str(tmp_path), files_per_second=0)
+
+    assert reclaimer._run_task(("moment", "e1", "a.jpg")) == FAILED
+    assert os.path.exists(path)
+    assert reclaimer.stats["remove_errors"] == 1
+
+
+def test_drain_keeps_going_after_a_task_raises(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_gc, "MEDIA_GC_RETRY_INTERVAL", 0.01)
+    reclaimer = MediaReclaimer(str(tmp_path), files_per_second=0)
+    calls = []
+
+    def flaky(task):
+        calls.append(task)
+        if len(calls) == 1:
+            raise RuntimeError("set changed size during iteration")
+        return DONE
+    reclaimer._run_task = flaky
+
+    async def drain():
+        reclaimer.start(lambda event_id: None, scan_orphans=False)
+        await reclaimer.enqueue(("event", "e1", None), ("event", "e2", None))
+        for _ in range(200):
+            if not reclaimer.queue:
+                break
+            await asyncio.sleep(0.01)
+        await reclaimer.stop()
+    asyncio.run(drain())
+
+    assert reclaimer.queue == {}
+    assert reclaimer.stats["task_errors"] == 1
+    assert reclaimer.stats["tasks_done"] == 2
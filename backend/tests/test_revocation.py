@@ -0,0 +1,65 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import auth
+import revocation
+from journal import Journal
+from revocation import RevocationList
+
+
+@pytest.fixture
+def revocations(monkeypatch):
+    fresh = RevocationList()
+    monkeypatch.setattr(auth, "revocations", fresh)
+    return fresh
+
+
+def issue_token() -> str:
+    return auth.create_access_token({"sub": next(iter(auth.users_db))}, timedelta(minutes=30))
+
+
+def test_logged_out_token_is_rejected(revocations):
+    token = issue_token()
+    other = issue_token()
+    assert auth.verify_token(token)["email"] == next(iter(auth.users_db))
+
+    asyncio.run(auth.revoke_token(token))
+
+    with pytest.raises(HTTPException) as raised:
+        auth.verify_token(token)
+    assert raised.value.status_code == 401
+    assert raised.value.detail == "Token has been revoked"
+    assert auth.verify_token(other)
+
+
+def test_revocations_are_forgotten_once_the_token_expires():
+    revocations = RevocationList(bucket_seconds=60)
+    exp = int(time.time()) + 600
+    revocations.add("jti-1", exp)
+    assert revocations.is_revoked("jti-1", exp)
+    assert not revocations.is_revoked("jti-2", exp)
+
+    revocations._purge(exp + 60)
+    assert len(revocations) == 0
+
+
+def test_revocations_survive_a_restart(tmp_path, monkeypatch):
+    written = Journal(str(tmp_path), fsync=False, commit_interval=0)
+    written.recover()
+    written.open()
+    monkeypatch.setattr(revocation, "journal", written)
+    exp = int(time.time()) + 600
+    before = RevocationList()
+    asyncio.run(before.revoke("jti-live", exp))
+    asyncio.run(before.revoke("jti-expired", int(time.time()) + 1))
+    written.close()
+
+    time.sleep(1.1)
+    after = RevocationList()
+    after.restore(Journal(str(tmp_path)).recover())
+    assert after.is_revoked("jti-live", exp)
+    assert len(after) == 1
@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from scheduler import Scheduler, to_timestamp
+
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def at(seconds: float) -> datetime:
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def test_rescheduling_moves_the_deadline():
+    scheduler = Scheduler()
+    scheduler.schedule("event", "e1", at(10))
+    scheduler.schedule("event", "e1", at(30))
+
+    assert scheduler.pop_due(to_timestamp(at(20))) == []
+    assert scheduler.pop_due(to_timestamp(at(30))) == [("event", "e1")]
+    assert scheduler.pending() == 0
+
+
+def test_cancelled_deadlines_never_fire():
+    scheduler = Scheduler()
+    scheduler.schedule("event", "e1", at(10))
+    scheduler.schedule("voucher", "e1", at(10))
+    scheduler.cancel("event", "e1")
+    scheduler.cancel("event", "missing")
+
+    assert scheduler.pop_due(to_timestamp(at(10))) == [("voucher", "e1")]
+    assert scheduler.dead == 0
+
+
+def test_heap_is_rebuilt_when_dead_entries_dominate():
+    scheduler = Scheduler()
+    for i in range(2000):
+        scheduler.schedule("event", f"e{i}", at(i))
+    for i in range(1500):
+        scheduler.cancel("event", f"e{i}")
+
+    # The rebuild ran once dead entries outnumbered live ones past the threshold
+    assert len(scheduler.heap) < 2000
+    assert len(scheduler.heap) == scheduler.pending() + scheduler.dead
+    due = scheduler.pop_due(to_timestamp(at(2000)))
+    assert due == [("event", f"e{i}") for i in range(1500, 2000)]
+
+
+def test_run_fires_handlers_when_deadlines_pass():
+    scheduler = Scheduler()
+    fired = []
+
+    async def handler(key):
+        fired.append(key)
+
+    async def run():
+        scheduler.register("event", handler)
+        scheduler.start()
+        now = datetime.now(timezone.utc)
+        scheduler.schedule("event", "late", now + timedelta(seconds=0.2))
+        scheduler.schedule("event", "soon", now + timedelta(seconds=0.05))
+        scheduler.schedule("event", "cancelled", now + timedelta(seconds=0.1))
+        scheduler.cancel("event", "cancelled")
+        await asyncio.sleep(0.4)
+        await scheduler.stop()
+    asyncio.run(run())
+
+    assert fired == ["soon", "late"]
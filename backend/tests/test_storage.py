@@ -0,0 +1,32 @@
+import asyncio
+import os
+import threading
+
+import storage
+from storage import ensure_dir
+
+
+def test_waiters_take_over_when_the_creator_is_cancelled(tmp_path, monkeypatch):
+    path = str(tmp_path / "e1" / "ab")
+    release = threading.Event()
+    makedirs = os.makedirs
+
+    def slow_makedirs(path, exist_ok=False):
+        release.wait(5)
+        makedirs(path, exist_ok=exist_ok)
+    monkeypatch.setattr(storage.os, "makedirs", slow_makedirs)
+
+    async def race():
+        creator = asyncio.create_task(ensure_dir(path))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.create_task(ensure_dir(path))
+        await asyncio.sleep(0.05)
+        creator.cancel()
+        release.set()
+        await asyncio.wait_for(waiter, timeout=5)
+        assert creator.cancelled()
+    asyncio.run(race())
+
+    assert os.path.isdir(path)
+    assert path in storage._known_dirs
+    assert path not in storage._creating
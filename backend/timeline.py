@@ -0,0 +1,173 @@
+"""
+Moment Timeline
+Per-event sorted arrays of moment times for vectorized histogram queries
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+import math
+import os
+
+import numpy as np
+
+from scheduler import to_timestamp
+
+# Configuration
+TIMELINE_MAX_BUCKETS = int(os.getenv("TIMELINE_MAX_BUCKETS", "5000"))
+TIMELINE_MAX_RESOLUTION = 366 * 24 * 3600  # one bucket per year
+TIMELINE_INITIAL_CAPACITY = 1024
+TIMELINE_CONTRIBUTOR_MATRIX_CELLS = 16 * 1024 * 1024
+
+
+def moment_time(moment: dict) -> float:
+    """When a moment was captured as epoch seconds, falling back to when it was uploaded
+
+    Client timestamps without a timezone are taken as UTC, like every other API datetime;
+    uploaded_at is written by the server in local time.
+    """
+    try:
+        return to_timestamp(datetime.fromisoformat(moment["timestamp"]))
+    except (KeyError, TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(moment["uploaded_at"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
+
+class EventTimeline:
+    """Moment times of one event kept sorted in a growable array, with a parallel contributor id array"""
+
+    def __init__(self):
+        self.times = np.empty(TIMELINE_INITIAL_CAPACITY, dtype=np.float64)
+        self.contributors = np.empty(TIMELINE_INITIAL_CAPACITY, dtype=np.int32)
+        self.size = 0
+        self.contributor_ids: Dict[str, int] = {}
+
+    def _reserve(self, extra: int):
+        needed = self.size + extra
+        if needed <= len(self.times):
+            return
+        capacity = max(needed, 2 * len(self.times))
+        for name in ("times", "contributors"):
+            old = getattr(self, name)
+            grown = np.empty(capacity, dtype=old.dtype)
+            grown[:self.size] = old[:self.size]
+            setattr(self, name, grown)
+
+    def _contributor(self, email: str) -> int:
+        return self.contributor_ids.setdefault(email, len(self.contributor_ids))
+
+    def add(self, at: float, email: str):
+        """Insert one moment; uploads mostly arrive in time order, which is an O(1) append"""
+        self._reserve(1)
+        contributor = self._contributor(email)
+        size = self.size
+        position = size if size == 0 or at >= self.times[size - 1] else \
+            int(np.searchsorted(self.times[:size], at, side="right"))
+        if position < size:
+            self.times[position + 1:size + 1] = self.times[position:size]
+            self.contributors[position + 1:size + 1] = self.contributors[position:size]
+        self.times[position] = at
+        self.contributors[position] = contributor
+        self.size += 1
+
+    def extend(self, times: Iterable[float], emails: Iterable[str]):
+        """Insert many moments at once with one merge"""
+        times = np.fromiter(times, dtype=np.float64)
+        contributors = np.fromiter((self._contributor(email) for email in emails), dtype=np.int32, count=len(times))
+        if not len(times):
+            return
+        order = np.argsort(times, kind="stable")
+        times, contributors = times[order], contributors[order]
+        self._reserve(len(times))
+        size = self.size
+        if size == 0 or times[0] >= self.times[size - 1]:
+            self.times[size:size + len(times)] = times
+            self.contributors[size:size + len(times)] = contributors
+        else:
+            merged_times = np.concatenate((self.times[:size], times))
+            merged_contributors = np.concatenate((self.contributors[:size], contributors))
+            order = np.argsort(merged_times, kind="stable")
+            self.times[:len(order)] = merged_times[order]
+            self.contributors[:len(order)] = merged_contributors[order]
+        self.size += len(times)
+
+    def histogram(self, start: Optional[float], end: Optional[float], resolution: float,
+                  max_buckets: int, with_contributors: bool = False) -> dict:
+        """Moment counts per `resolution`-second bucket over [start, end)
+
+        The resolution is widened when the range would need more than `max_buckets` buckets.
+        """
+        times = self.times[:self.size]
+        if start is None:
+            start = float(times[0]) if self.size else 0.0
+        lo = int(np.searchsorted(times, start, side="left"))
+        if end is None:
+            # Run through the bucket holding the latest moment
+            span = float(times[-1]) - start if lo < self.size else -1.0
+            if span < 0:
+                end, buckets = start, 0
+            else:
+                resolution = max(resolution, span / max_buckets)
+                buckets = min(max_buckets, math.floor(span / resolution) + 1)
+                end = start + buckets * resolution
+            hi = self.size if buckets else lo
+        else:
+            span = max(0.0, end - start)
+            resolution = max(resolution, span / max_buckets)
+            buckets = math.ceil(span / resolution)
+            hi = max(lo, int(np.searchsorted(times, end, side="left")))
+
+        # The array is sorted, so bucket edges split it with one binary search each
+        edges = start + np.arange(1, buckets) * resolution
+        cuts = np.clip(np.searchsorted(times, edges, side="left"), lo, hi)
+        counts = np.diff(np.concatenate(([lo], cuts, [hi]))) if buckets else np.zeros(0, dtype=np.int64)
+        result = {
+            "start": start,
+            "end": end,
+            "resolution": float(resolution),
+            "total": int(hi - lo),
+            "counts": counts.tolist(),
+        }
+        if with_contributors:
+            index = np.repeat(np.arange(buckets), counts)
+            width = max(1, len(self.contributor_ids))
+            if buckets * width <= TIMELINE_CONTRIBUTOR_MATRIX_CELLS:
+                # Flag (bucket, contributor) cells, then count flags per bucket
+                seen = np.zeros((buckets, width), dtype=bool)
+                seen[index, self.contributors[lo:hi]] = True
+                result["contributors"] = seen.sum(axis=1).tolist()
+            else:
+                pairs = np.unique(index * width + self.contributors[lo:hi])
+                result["contributors"] = np.bincount(pairs // width, minlength=buckets).tolist()
+        return result
+
+
+class TimelineIndex:
+    def __init__(self):
+        self.events: Dict[str, EventTimeline] = {}
+
+    def _event(self, event_id: str) -> EventTimeline:
+        timeline = self.events.get(event_id)
+        if timeline is None:
+            timeline = self.events[event_id] = EventTimeline()
+        return timeline
+
+    def add_moments(self, event_id: str, moments: list):
+        timeline = self._event(event_id)
+        if len(moments) == 1:
+            timeline.add(moment_time(moments[0]), moments[0]["user_id"])
+        else:
+            timeline.extend((moment_time(moment) for moment in moments), (moment["user_id"] for moment in moments))
+
+    def forget_event(self, event_id: str):
+        self.events.pop(event_id, None)
+
+    def histogram(self, event_id: str, start: Optional[float], end: Optional[float], resolution: float,
+                  max_buckets: int = TIMELINE_MAX_BUCKETS, with_contributors: bool = False) -> dict:
+        timeline = self.events.get(event_id) or EventTimeline()
+        return timeline.histogram(start, end, resolution, max_buckets, with_contributors)
+
+
+timelines = TimelineIndex()